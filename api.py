@@ -0,0 +1,126 @@
+"""API HTTP ligera (solo biblioteca estándar) sobre el motor de WhatsMyName.
+
+    GET /scan?username=a&username=b&category=social&all=1&refresh=1  -> NDJSON en streaming
+        (opcionales: deadline=segundos, max_hits=N, priority=social,coding, incremental=1, max_age=segundos)
+    GET /changes?username=a&since=epoch&limit=N                      -> JSON
+    GET /email?address=alguien@example.com                           -> JSON
+    GET /emails?address=a@x.com&address=b@y.com                      -> NDJSON en streaming
+    GET /health                                                      -> JSON
+    GET /metrics                                                     -> métricas en formato Prometheus
+"""
+import json
+import logging
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import ScanControl, analyze_email, analyze_emails, get_site_health, load_site_index, parse_usernames
+from history import HISTORY_MAX_AGE, get_scan_history, tracked_records
+from metrics import METRICS
+
+log = logging.getLogger("whatsmyname")
+
+# Tope de usuarios por petición para que un solo cliente no acapare el motor
+MAX_API_USERNAMES = 500
+MAX_API_EMAILS = 5000
+
+def flag(params, name):
+    return params.get(name, ["0"])[-1].lower() in ("1", "true", "yes", "si")
+
+def number(params, name, cast=float):
+    try: return cast(params[name][-1])
+    except (KeyError, ValueError): return None
+
+class APIHandler(BaseHTTPRequestHandler):
+    server_version = "WhatsMyNameAPI/1.0"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        routes = {"/scan": self.handle_scan, "/email": self.handle_email, "/emails": self.handle_emails, "/health": self.handle_health,
+                  "/metrics": self.handle_metrics, "/changes": self.handle_changes}
+        handler = routes.get(url.path)
+        if handler is None:
+            return self.send_json({"error": "ruta no encontrada"}, 404)
+        handler(params)
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_health(self, params):
+        index = load_site_index()
+        self.send_json({"status": "ok", "catalog_version": index.version, "sites": len(index.sites),
+                        "quarantined": get_site_health().quarantined()})
+
+    def handle_metrics(self, params):
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_email(self, params):
+        address = params.get("address", [""])[-1]
+        if not address:
+            return self.send_json({"error": "falta el parámetro address"}, 400)
+        self.send_json(dict(analyze_email(address), email=address))
+
+    def handle_emails(self, params):
+        addresses = parse_usernames("\n".join(params.get("address", [])))
+        if not addresses:
+            return self.send_json({"error": "falta el parámetro address"}, 400)
+        if len(addresses) > MAX_API_EMAILS:
+            return self.send_json({"error": f"máximo {MAX_API_EMAILS} correos por petición"}, 400)
+        self.stream_ndjson(analyze_emails(addresses))
+
+    def handle_scan(self, params):
+        usernames = parse_usernames("\n".join(params.get("username", [])))
+        if not usernames:
+            return self.send_json({"error": "falta el parámetro username"}, 400)
+        if len(usernames) > MAX_API_USERNAMES:
+            return self.send_json({"error": f"máximo {MAX_API_USERNAMES} usuarios por petición"}, 400)
+
+        control = ScanControl(number(params, "deadline"), number(params, "max_hits", int))
+        priority = [c for c in params.get("priority", [""])[-1].split(",") if c] or None
+        self.stream_ndjson(tracked_records(usernames, params.get("category", [None])[-1], flag(params, "all"), flag(params, "refresh"),
+                                           control=control, priority=priority, incremental=flag(params, "incremental"),
+                                           max_age=number(params, "max_age") or HISTORY_MAX_AGE))
+
+    def handle_changes(self, params):
+        usernames = parse_usernames("\n".join(params.get("username", [])))
+        self.send_json(get_scan_history().changes(usernames, number(params, "since"), number(params, "limit", int) or 1000))
+
+    def stream_ndjson(self, records):
+        # HTTP/1.0 sin Content-Length: cada línea sale en cuanto termina su verificación
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for record in records:
+                self.wfile.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Al cerrar el generador se cancelan las verificaciones pendientes
+            log.info("Cliente desconectado durante el escaneo")
+        finally:
+            records.close()
+
+    def log_message(self, format, *args):
+        log.info("%s - %s", self.address_string(), format % args)
+
+def serve(host="127.0.0.1", port=8080):
+    server = ThreadingHTTPServer((host, port), APIHandler)
+    server.daemon_threads = True
+    log.info("API escuchando en http://%s:%s", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
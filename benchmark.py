@@ -0,0 +1,297 @@
+"""Benchmark reproducible del motor sin tocar sitios reales.
+
+Genera un wmn-data.json sintético que apunta a servidores HTTP locales (uno por
+"host", en un proceso aparte para no contaminar la medida de memoria) que
+emulan latencia, códigos de estado, tamaño de cuerpo, posición de e_string,
+limitación (429) y timeouts. Después lanza escaneos con el motor, genera los
+reportes e informa checks/s, latencias p50/p95/p99, RSS pico y bytes leídos.
+Cada motor se mide en su propio proceso: el RSS pico es el de ese escaneo y no
+hereda salud de sitios, limitadores ni cachés de la pasada anterior.
+
+    python benchmark.py --sites 600 --hosts 40 --usernames 3
+    python benchmark.py --engine both --json bench.json --min-throughput 200 --max-p95 500
+
+Con --min-throughput / --max-p95 el proceso sale con código 1 si no se
+cumplen los umbrales, para detectar regresiones en CI.
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ["social", "coding", "gaming", "video", "news", "business"]
+E_STRING = "data-profile-ok"
+M_STRING = "Page Not Found"
+# PNG de 1x1 para los avatares del PDF
+AVATAR_PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==")
+
+# --- 1. SERVIDOR DE PRUEBA ---
+def site_profiles(args):
+    """Comportamiento fijo de cada sitio sintético (determinista según --seed)"""
+    rng = random.Random(args.seed)
+    profiles = []
+    for i in range(args.sites):
+        profiles.append({
+            "host": i % args.hosts,
+            "has_user": rng.random() < args.hit_rate,
+            "status_only": rng.random() < args.status_only_rate,
+            "body_bytes": max(256, int(rng.gauss(args.body_kb, args.body_kb / 4) * 1024)),
+        })
+    return profiles
+
+def build_body(size, marker, position, port, site_id):
+    head = (f"<html><head><title>Perfil {site_id}</title>"
+            f"<meta property='og:image' content='http://127.0.0.1:{port}/img/{site_id}.png'></head><body>").encode()
+    filler = max(0, size - len(head) - len(marker) - 14)
+    at = {"start": 0, "middle": filler // 2, "end": filler}[position]
+    return head + b"x" * at + marker + b"x" * (filler - at) + b"</body></html>"
+
+def make_handler(args, profiles, port):
+    bodies = {}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def reply(self, status, body=b"", headers=()):
+            self.send_response(status)
+            for k, v in headers: self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try: self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError): pass
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts[0] == "img":
+                return self.reply(200, AVATAR_PNG, [("Content-Type", "image/png")])
+            if parts[0] != "s" or len(parts) < 3:
+                return self.reply(404)
+            site_id, username = int(parts[1]), parts[2]
+            profile = profiles[site_id]
+            time.sleep(max(0.0, random.gauss(args.latency_ms, args.jitter_ms)) / 1000)
+            if random.random() < args.timeout_rate:
+                time.sleep(args.timeout_s)
+            if random.random() < args.throttle_rate:
+                return self.reply(429, headers=[("Retry-After", "1")])
+
+            found = profile["has_user"] and username.startswith("hit")
+            if profile["status_only"]:
+                status, marker = (200, b"") if found else (404, M_STRING.encode())
+            else:
+                status, marker = 200, (E_STRING if found else M_STRING).encode()
+            key = (site_id, found)
+            with lock:
+                body = bodies.get(key)
+                if body is None:
+                    body = bodies[key] = build_body(profile["body_bytes"], marker, args.e_string_position, port, site_id)
+            self.reply(status, body, [("Content-Type", "text/html; charset=utf-8")])
+
+    return StubHandler
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Al terminar, cada proceso de escaneo corta sus conexiones keep-alive: no es un fallo
+        if not isinstance(sys.exc_info()[1], ConnectionError): super().handle_error(request, client_address)
+
+def run_stub_servers(args, profiles, ports_queue, stop_event):
+    servers = []
+    for _ in range(args.hosts):
+        server = StubServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+        server.RequestHandlerClass = make_handler(args, profiles, server.server_address[1])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    ports_queue.put([s.server_address[1] for s in servers])
+    stop_event.wait()
+
+def synthetic_catalog(profiles, ports):
+    sites = []
+    for i, profile in enumerate(profiles):
+        port = ports[profile["host"]]
+        sites.append({
+            "name": f"Bench{i}",
+            "uri_check": f"http://127.0.0.1:{port}/s/{i}/{{account}}",
+            "e_code": 200,
+            "e_string": "" if profile["status_only"] else E_STRING,
+            "m_code": 404 if profile["status_only"] else 200,
+            "m_string": M_STRING,
+            "cat": CATEGORIES[i % len(CATEGORIES)],
+        })
+    return {"sites": sites}
+
+# --- 2. MEDICIÓN ---
+def percentile(values, q):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1) + 0.5))]
+
+def peak_rss_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+class TimedEngine:
+    """Envuelve un motor para medir la latencia de cada verificación (envío -> resultado)"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.latencies = []
+
+    def submit(self, site, username):
+        start = time.perf_counter()
+        future = self.engine.submit(site, username)
+        future.add_done_callback(lambda f: self.latencies.append(time.perf_counter() - start))
+        return future
+
+def bench_scan(engine_mod, kind, index, usernames):
+    from metrics import ScanMetrics
+    timed = TimedEngine(engine_mod.get_scan_engine(kind))
+    metrics = ScanMetrics()
+    found = inconclusive = checks = 0
+    hits = []
+    start = time.perf_counter()
+    for _, _, res in engine_mod.scan_batch(usernames, index.sites, timed, index.version, refresh=True, metrics=metrics):
+        checks += 1
+        if engine_mod.is_hit(res):
+            found += 1
+            hits.append(res)
+        elif res:
+            inconclusive += 1
+    wall = time.perf_counter() - start
+    latencies_ms = [x * 1000 for x in timed.latencies]
+    summary = metrics.summary(top=5)
+    return {
+        "engine": kind,
+        "checks": checks,
+        "wall_s": round(wall, 3),
+        "checks_per_s": round(checks / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 1),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 1),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 1),
+        "found": found,
+        "inconclusive": inconclusive,
+        "bytes_read_mb": round(summary["bytes_read"] / (1024 * 1024), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "errors": summary["errors"],
+        "phase_mean_ms": {phase: p["mean_ms"] for phase, p in summary["phases"].items()},
+    }, hits
+
+def scan_in_child(kind, usernames):
+    """Escaneo de un motor en un proceso nuevo (spawn): catálogo, salud, limitadores y
+    RSS pico empiezan desde cero. La configuración llega por las variables de entorno"""
+    import engine as engine_mod
+    start = time.perf_counter()
+    index = engine_mod.load_site_index()
+    catalog_load_ms = round((time.perf_counter() - start) * 1000, 1)
+    result, hits = bench_scan(engine_mod, kind, index, usernames)
+    result["catalog_load_ms"] = catalog_load_ms
+    return result, hits
+
+def bench_reports(reports_mod, hits):
+    # pandas y fpdf se cargan perezosamente: se calientan antes para medir solo la generación
+    reports_mod.build_csv(hits[:1], "bench")
+    reports_mod.get_pdf_class()
+    timings = {}
+    start = time.perf_counter()
+    csv = reports_mod.build_csv(hits, "bench")
+    timings["csv_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    reports_mod.build_txt(hits, "bench", "bench")
+    timings["txt_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    pdf = reports_mod.build_pdf(hits, "bench", "bench")
+    timings["pdf_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    timings["csv_kb"] = round(len(csv) / 1024, 1)
+    timings["pdf_kb"] = round(len(pdf or b"") / 1024, 1)
+    return timings
+
+# --- 3. EJECUCIÓN ---
+def build_parser():
+    p = argparse.ArgumentParser(description="Benchmark offline del motor de WhatsMyName")
+    p.add_argument("--sites", type=int, default=600)
+    p.add_argument("--hosts", type=int, default=40, help="servidores locales (hosts distintos)")
+    p.add_argument("--usernames", type=int, default=2, help="usuarios por escaneo (la mitad existen)")
+    p.add_argument("--engine", choices=["async", "threads", "both"], default="both")
+    p.add_argument("--latency-ms", type=float, default=40)
+    p.add_argument("--jitter-ms", type=float, default=15)
+    p.add_argument("--body-kb", type=float, default=64)
+    p.add_argument("--e-string-position", choices=["start", "middle", "end"], default="end")
+    p.add_argument("--hit-rate", type=float, default=0.3, help="fracción de sitios donde existe el usuario")
+    p.add_argument("--status-only-rate", type=float, default=0.3, help="fracción de sitios que deciden solo por código")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="probabilidad de responder 429")
+    p.add_argument("--timeout-rate", type=float, default=0.0, help="probabilidad de no responder a tiempo")
+    p.add_argument("--timeout-s", type=float, default=8.0)
+    p.add_argument("--no-reports", action="store_true", help="no medir la generación de CSV/TXT/PDF")
+    p.add_argument("--seed", type=int, default=59)
+    p.add_argument("--json", help="guardar el informe en este archivo")
+    p.add_argument("--min-throughput", type=float, help="falla si checks/s queda por debajo")
+    p.add_argument("--max-p95", type=float, help="falla si la latencia p95 (ms) queda por encima")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    profiles = site_profiles(args)
+
+    ports_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    stub = multiprocessing.Process(target=run_stub_servers, args=(args, profiles, ports_queue, stop_event), daemon=True)
+    stub.start()
+    ports = ports_queue.get(timeout=30)
+
+    # El catálogo sintético se sirve como caché local; la red real nunca se consulta
+    cache_dir = tempfile.mkdtemp(prefix="wmn-bench-")
+    with open(os.path.join(cache_dir, "wmn-data.json"), "w", encoding="utf-8") as f:
+        json.dump(synthetic_catalog(profiles, ports), f)
+    with open(os.path.join(cache_dir, "wmn-data.meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"checked_at": time.time()}, f)
+    os.environ["WMN_CACHE_DIR"] = cache_dir
+    os.environ.setdefault("WMN_CATALOG_REFRESH", str(10 ** 9))
+    # Todos los hosts son 127.0.0.1: se sube el límite por host para medir el motor, no el limitador
+    os.environ.setdefault("WMN_HOST_RATE", "1000")
+    os.environ.setdefault("WMN_HOST_BURST", "1000")
+
+    report = {"config": vars(args), "scans": []}
+    usernames = [f"{'hit' if i % 2 == 0 else 'miss'}{i}" for i in range(args.usernames)]
+    hits = []
+    for kind in (["async", "threads"] if args.engine == "both" else [args.engine]):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as child:
+            result, hits = child.submit(scan_in_child, kind, usernames).result()
+        report["scans"].append(result)
+    report["catalog_load_ms"] = report["scans"][0]["catalog_load_ms"]
+    if not args.no_reports and hits:
+        import reports as reports_mod
+        report["reports"] = bench_reports(reports_mod, hits)
+
+    stop_event.set()
+    stub.join(timeout=5)
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for scan in report["scans"]:
+        if args.min_throughput and scan["checks_per_s"] < args.min_throughput:
+            print(f"FALLO: {scan['engine']} {scan['checks_per_s']} checks/s < {args.min_throughput}", file=sys.stderr)
+            failed = True
+        if args.max_p95 and scan["p95_ms"] > args.max_p95:
+            print(f"FALLO: {scan['engine']} p95 {scan['p95_ms']} ms > {args.max_p95}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Línea de comandos de WhatsMyName: escaneos sin interfaz con salida NDJSON.
+
+    python cli.py scan manuelbot59 otro_usuario --category social
+    python cli.py scan --file usuarios.txt --all > resultados.jsonl
+    python cli.py scan manuelbot59 --metrics metricas.json
+    python cli.py scan manuelbot59 --deadline 20 --max-hits 5 --priority social,coding
+    python cli.py scan --file vigilados.txt --incremental --max-age 24
+    python cli.py scan --file vigilados.txt --export salida/lote --export-formats jsonl,csv,parquet
+    python cli.py changes manuelbot59 --since 48
+    python cli.py variants manuelbot59 --category social
+    python cli.py email alguien@example.com
+    python cli.py email --file correos.txt --format csv > correos.csv
+    python cli.py serve --host 0.0.0.0 --port 8080
+    python cli.py catalog --bundle
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+
+import time
+
+from engine import (
+    BUNDLED_CATALOG_PATH, MAX_VARIANTS, ScanControl, analyze_emails, bundle_catalog, get_catalog, get_scan_engine, is_hit, load_site_index,
+    parse_usernames, plan_variant_checks, rank_variants, scan_variants, username_variants,
+)
+from history import HISTORY_MAX_AGE, get_scan_history, tracked_records
+from metrics import ScanMetrics
+from reports import EMAIL_CSV_FIELDS, EXPORT_FORMATS, StreamingExport, email_row
+
+def write_ndjson(record, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    stream.flush()
+
+def read_inputs(values, path):
+    """Entradas desde argumentos y, opcionalmente, un archivo ('-' = stdin)"""
+    text = "\n".join(values)
+    if path:
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+            text += "\n" + f.read()
+    return parse_usernames(text)
+
+def cmd_scan(args):
+    usernames = read_inputs(args.usernames, args.file)
+    if not usernames:
+        print("Indica al menos un usuario (argumentos o --file)", file=sys.stderr)
+        return 2
+
+    engine = get_scan_engine(args.engine) if args.engine else None
+    metrics = ScanMetrics() if args.metrics else None
+    control = ScanControl(args.deadline, args.max_hits)
+    priority = [c.strip() for c in args.priority.split(",") if c.strip()] if args.priority else None
+    export = StreamingExport(args.export, args.export_formats.split(",")) if args.export else None
+    hits = changes = 0
+    try:
+        for record in tracked_records(usernames, args.category, args.all, args.refresh, engine, metrics, control, priority,
+                                      args.incremental, args.max_age * 3600):
+            hits += is_hit(record)
+            changes += 'change' in record
+            write_ndjson(record)
+            if export is not None: export.add(record)
+    except KeyboardInterrupt:
+        control.cancel()
+    finally:
+        if export is not None: export.close()
+    print(f"{len(usernames)} usuarios, {hits} hallazgos, {changes} cambios" + (f" (detenido: {control.reason})" if control.reason else ""), file=sys.stderr)
+    if metrics is not None:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(metrics.summary(), f, ensure_ascii=False, indent=2)
+    return 0
+
+def cmd_email(args):
+    addresses = read_inputs(args.addresses, args.file)
+    if not addresses:
+        print("Indica al menos un correo (argumentos o --file)", file=sys.stderr)
+        return 2
+    writer = None
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, EMAIL_CSV_FIELDS)
+        writer.writeheader()
+    for res in analyze_emails(addresses):
+        if writer is None: write_ndjson(res)
+        else:
+            writer.writerow(email_row(res))
+            sys.stdout.flush()
+    return 0
+
+def cmd_variants(args):
+    variants = username_variants(args.seed, args.max)
+    if args.list:
+        for variant in variants: print(variant)
+        return 0
+    index = load_site_index(wait=True)
+    sites = index.filter(args.category)
+    checks = sum(len(v) for v in plan_variant_checks(variants, sites).values())
+    print(f"{len(variants)} variantes, {checks} verificaciones (de {len(variants) * len(sites)} posibles)", file=sys.stderr)
+    control = ScanControl(args.deadline)
+    hits = []
+    try:
+        for _, _, res in scan_variants(variants, sites, get_scan_engine(args.engine) if args.engine else None, index.version,
+                                       control=control):
+            if is_hit(res):
+                hits.append(res)
+                write_ndjson(res)
+    except KeyboardInterrupt:
+        control.cancel()
+    for entry in rank_variants(hits, variants):
+        print(f"{entry['score']:6.2f}  {entry['hits']:4d}  {entry['username']}", file=sys.stderr)
+    return 0
+
+def cmd_changes(args):
+    since = time.time() - args.since * 3600 if args.since else None
+    for change in get_scan_history().changes(read_inputs(args.usernames, args.file), since, args.limit):
+        write_ndjson(change)
+    return 0
+
+def cmd_catalog(args):
+    if args.bundle:
+        sites, version = bundle_catalog()
+        print(f"{BUNDLED_CATALOG_PATH}: {sites} sitios (versión {version})", file=sys.stderr)
+        return 0
+    catalog = get_catalog()
+    if args.refresh: catalog.refresh_now()
+    print(f"{len(catalog.sites)} sitios · versión {catalog.version} · origen {catalog.data['source']}", file=sys.stderr)
+    return 0 if catalog.sites else 1
+
+def cmd_serve(args):
+    from api import serve
+    serve(args.host, args.port)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="WhatsMyName sin interfaz: resultados en NDJSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostrar avisos del motor en stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="buscar uno o varios usuarios en todos los sitios")
+    scan.add_argument("usernames", nargs="*")
+    scan.add_argument("-f", "--file", help="archivo con usuarios (uno por línea); '-' para stdin")
+    scan.add_argument("-c", "--category", help="solo sitios de esta categoría")
+    scan.add_argument("--all", action="store_true", help="incluir también 'no existe' e inconclusos")
+    scan.add_argument("--refresh", action="store_true", help="ignorar la caché de resultados")
+    scan.add_argument("--engine", choices=["async", "threads"], help="motor de escaneo")
+    scan.add_argument("--metrics", help="guardar el resumen de tiempos y errores del escaneo (JSON)")
+    scan.add_argument("--deadline", type=float, help="parar tras estos segundos")
+    scan.add_argument("--max-hits", type=int, help="parar tras N hallazgos")
+    scan.add_argument("--priority", help="categorías a verificar primero, separadas por comas")
+    scan.add_argument("--incremental", action="store_true", help="verificar solo lo caducado o inconcluso según el historial")
+    scan.add_argument("--max-age", type=float, default=HISTORY_MAX_AGE / 3600, help="horas tras las que un resultado del historial caduca")
+    scan.add_argument("--export", metavar="RUTA", help="escribir además los registros en RUTA.jsonl/.csv/.parquet según llegan")
+    scan.add_argument("--export-formats", default="jsonl,csv", help=f"formatos de --export ({','.join(EXPORT_FORMATS)})")
+    scan.set_defaults(func=cmd_scan)
+
+    variants = sub.add_parser("variants", help="buscar las variantes de un usuario como un solo lote y ordenarlas")
+    variants.add_argument("seed")
+    variants.add_argument("-c", "--category", help="solo sitios de esta categoría")
+    variants.add_argument("--max", type=int, default=MAX_VARIANTS, help="máximo de variantes")
+    variants.add_argument("--list", action="store_true", help="solo listar las variantes, sin verificar")
+    variants.add_argument("--deadline", type=float, help="parar tras estos segundos")
+    variants.add_argument("--engine", choices=["async", "threads"], help="motor de escaneo")
+    variants.set_defaults(func=cmd_variants)
+
+    changes = sub.add_parser("changes", help="cambios registrados en el historial (cuentas nuevas, desaparecidas, perfiles)")
+    changes.add_argument("usernames", nargs="*")
+    changes.add_argument("-f", "--file", help="archivo con usuarios (uno por línea); '-' para stdin")
+    changes.add_argument("--since", type=float, help="solo los de las últimas N horas")
+    changes.add_argument("--limit", type=int, default=1000)
+    changes.set_defaults(func=cmd_changes)
+
+    email = sub.add_parser("email", help="analizar una o varias direcciones de correo")
+    email.add_argument("addresses", nargs="*")
+    email.add_argument("-f", "--file", help="archivo con correos (uno por línea); '-' para stdin")
+    email.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    email.set_defaults(func=cmd_email)
+
+    catalog = sub.add_parser("catalog", help="estado del catálogo de sitios, o generar la instantánea incluida")
+    catalog.add_argument("--refresh", action="store_true", help="descargar ya el catálogo a la caché local")
+    catalog.add_argument("--bundle", action="store_true", help=f"descargar el catálogo a {BUNDLED_CATALOG_PATH} (paso de build)")
+    catalog.set_defaults(func=cmd_catalog)
+
+    serve = sub.add_parser("serve", help="levantar la API HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, stream=sys.stderr)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1571 @@
+"""Motor de escaneo de WhatsMyName, independiente de Streamlit.
+
+Lo usan la interfaz (main.py), la línea de comandos (cli.py) y la API HTTP (api.py).
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from html.parser import HTMLParser
+import queue
+import subprocess
+import sys
+import asyncio
+import atexit
+import threading
+import itertools
+import functools
+import copy
+import sqlite3
+import unicodedata
+import contextlib
+import json
+import hashlib
+import logging
+from collections import OrderedDict, deque
+import urllib.parse
+from datetime import datetime, timezone
+import time
+import random
+from email.utils import parsedate_to_datetime
+import os
+import re
+from metrics import METRICS, CheckTrace
+
+# Importamos socid-extractor
+try:
+    from socid_extractor import extract as socid_extract
+except ImportError:
+    socid_extract = None
+
+# Motor asíncrono opcional (si no está instalado se usa el pool de hilos)
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger("whatsmyname")
+
+WMN_DATA_URL = "https://raw.githubusercontent.com/WebBreacher/WhatsMyName/main/wmn-data.json"
+
+def shared_resource(func):
+    """Recurso único por proceso y argumentos (el equivalente a st.cache_resource
+    sin Streamlit): seguro entre hilos y compartido por todas las sesiones."""
+    instances = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        with lock:
+            if args not in instances: instances[args] = func(*args)
+            return instances[args]
+    return wrapper
+
+# --- 1. MOTORES DE EXTRACCIÓN (USUARIOS) ---
+# Motor de escaneo: "async" (un solo bucle asyncio) o "threads" (pool de hilos)
+SCAN_ENGINE = os.environ.get("WMN_ENGINE", "async")
+# Techo global de verificaciones simultáneas y conexiones por host
+MAX_CONCURRENCY = int(os.environ.get("WMN_MAX_CONCURRENCY", "100"))
+MAX_PER_HOST = int(os.environ.get("WMN_MAX_PER_HOST", "6"))
+CHECK_TIMEOUT = 6
+# Lectura en streaming del cuerpo: tamaño de trozo y tope de bytes por sitio
+STREAM_CHUNK = 16 * 1024
+MAX_BODY_BYTES = int(os.environ.get("WMN_MAX_BODY_BYTES", str(2 * 1024 * 1024)))
+# Tras confirmar un perfil solo se conserva la cabecera HTML para los extractores
+EXTRACT_BYTE_CAP = 256 * 1024
+# socid-extractor (CPU puro) corre en procesos trabajadores acotados; 0 = en el propio hilo
+EXTRACT_WORKERS = int(os.environ.get("WMN_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACT_TIMEOUT = 5
+EXTRACT_WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract_worker.py")
+# Imagen de respaldo de los perfiles sin avatar
+FAVICON_URL = "https://www.google.com/s2/favicons?domain={domain}&sz=128"
+# Si al cortar quedan pocos bytes se terminan de leer para no perder la conexión keep-alive
+KEEPALIVE_DRAIN_BYTES = 64 * 1024
+# Límite de peticiones por host (token bucket) y política de reintentos
+HOST_RATE = float(os.environ.get("WMN_HOST_RATE", "5"))
+HOST_BURST = int(os.environ.get("WMN_HOST_BURST", "10"))
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.5
+RETRY_AFTER_MAX = 30
+# Fracción de peticiones que se puede gastar en reintentos
+RETRY_BUDGET_RATIO = 0.1
+# Caché de resultados: vigencia, tamaño en memoria y SQLite opcional compartido
+RESULT_CACHE_TTL = int(os.environ.get("WMN_RESULT_TTL", str(6 * 3600)))
+RESULT_CACHE_SIZE = int(os.environ.get("WMN_RESULT_CACHE_SIZE", "50000"))
+# El SQLite va en modo WAL, que necesita memoria compartida: solo sirve para procesos
+# del mismo host (no en NFS/SMB); cada host necesita su propio archivo
+RESULT_CACHE_DB = os.environ.get("WMN_RESULT_DB")
+# Escrituras agrupadas en el SQLite: se acumulan en memoria y cada tanda va en una
+# transacción corta, al llenarse o a los pocos segundos, sin retener el bloqueo entre tandas
+RESULT_CACHE_COMMIT_EVERY = 200
+RESULT_CACHE_COMMIT_INTERVAL = 2
+# Salud por sitio: timeout adaptativo (p95 × factor, entre el mínimo y CHECK_TIMEOUT)
+# y cuarentena tras fallos de red consecutivos, con sondeos en segundo plano
+ADAPTIVE_TIMEOUT_MIN = float(os.environ.get("WMN_TIMEOUT_MIN", "2"))
+ADAPTIVE_TIMEOUT_FACTOR = 3
+HEALTH_WINDOW = 50
+HEALTH_MIN_SAMPLES = 5
+QUARANTINE_AFTER = int(os.environ.get("WMN_QUARANTINE_AFTER", "3"))
+QUARANTINE_BASE = 300
+QUARANTINE_MAX = 6 * 3600
+QUARANTINE_PROBE_INTERVAL = 30
+# Fallos que cuentan para la cuarentena (la limitación por 429 no: el sitio está vivo)
+HEALTH_FAILURES = ("timeout", "dns_error", "tls_error", "connection_error", "http_error")
+
+# Resultado de cada verificación: sin respuesta fiable no se dice "no existe"
+FOUND = "found"
+NOT_FOUND = "not_found"
+INCONCLUSIVE = "inconclusive"
+
+def get_headers():
+    return {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
+
+@shared_resource
+def get_session():
+    """Sesión HTTP compartida con conexiones keep-alive y límite de conexiones por host"""
+    session = requests.Session()
+    # pool_block=True hace esperar al hilo en vez de abrir conexiones extra al mismo host
+    adapter = HTTPAdapter(pool_connections=256, pool_maxsize=MAX_PER_HOST, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(get_headers())
+    return session
+
+def parse_json(body):
+    """Intenta reutilizar un cuerpo ya descargado como JSON (las APIs de WhatsMyName)"""
+    if not body: return None
+    try: return json.loads(body)
+    except: return None
+
+class HeadMetaParser(HTMLParser):
+    """Lee <title> y las <meta> de la cabecera y deja de procesar al llegar a </head> o <body>"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title = None
+        self.done = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done: return
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = attrs.get("property") or attrs.get("name")
+            if key and attrs.get("content") is not None: self.meta.setdefault(key.lower(), attrs["content"])
+        elif tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts)
+            self._title_parts = None
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None: self._title_parts.append(data)
+
+def parse_head_meta(html):
+    """(título, {propiedad/nombre: contenido}) de la cabecera HTML, sin construir un árbol"""
+    end = html.lower().find("</head>")
+    parser = HeadMetaParser()
+    parser.feed(html if end < 0 else html[:end + len("</head>")])
+    return parser.title, parser.meta
+
+def extract_telegram(username, body=None, uri=None):
+    # Solo se vuelve a pedir t.me si el cuerpo de la verificación no es esa página
+    page = body if uri and "//t.me/" in uri else None
+    if page is None:
+        page = get_session().get(f"https://t.me/{username}", headers=get_headers(), timeout=5).text
+    _, meta = parse_head_meta(page)
+    
+    details = {}
+    if "og:title" in meta:
+        name_raw = meta["og:title"].replace("Telegram: Contact @", "")
+        details["Nombre Visible"] = name_raw.split(" - ")[0]
+    if "og:description" in meta: details["Biografía"] = meta["og:description"]
+    return details, meta.get("og:image")
+
+def extract_gitlab(username, body=None, uri=None):
+    data_list = parse_json(body)
+    if not isinstance(data_list, list):
+        r = get_session().get(f"https://gitlab.com/api/v4/users?username={username}", headers=get_headers(), timeout=5)
+        data_list = r.json() if r.status_code == 200 else None
+    if data_list and len(data_list) > 0:
+        user = data_list[0]
+        details = {
+            "ID": user.get("id"),
+            "Username": user.get("username"),
+            "Nombre": user.get("name"),
+            "Estado": user.get("state"),
+            "Email Público": user.get("public_email", "Oculto"),
+            "Web URL": user.get("web_url")
+        }
+        return {k: v for k, v in details.items() if v}, user.get("avatar_url")
+    return {}, None
+
+def extract_github(username, body=None, uri=None):
+    data = parse_json(body)
+    # La página HTML del perfil no trae seguidores ni fechas: en ese caso sí se consulta la API
+    if not isinstance(data, dict) or "login" not in data:
+        r = get_session().get(f"https://api.github.com/users/{username}", headers=get_headers(), timeout=5)
+        data = r.json() if r.status_code == 200 else None
+    if data:
+        details = {
+            "ID": data.get("id"),
+            "Node ID": data.get("node_id"),
+            "Tipo": data.get("type"),
+            "Nombre": data.get("name"),
+            "Empresa": data.get("company"),
+            "Blog": data.get("blog"),
+            "Ubicación": data.get("location"),
+            "Email": data.get("email"),
+            "Bio": data.get("bio"),
+            "Twitter": data.get("twitter_username"),
+            "Repos Públicos": data.get("public_repos"),
+            "Seguidores": data.get("followers"),
+            "Siguiendo": data.get("following"),
+            "Creado": data.get("created_at"),
+            "Actualizado": data.get("updated_at")
+        }
+        return {k: v for k, v in details.items() if v}, data.get("avatar_url")
+    return {}, None
+
+def extract_gravatar(username, body=None, uri=None):
+    data = parse_json(body)
+    if not isinstance(data, dict) or "entry" not in data:
+        r = get_session().get(f"https://en.gravatar.com/{username}.json", headers=get_headers(), timeout=5)
+        data = r.json() if r.status_code == 200 else None
+    if data:
+        data = data['entry'][0]
+        return {"Nombre": data.get("displayName"), "Ubicación": data.get("currentLocation")}, data.get("thumbnailUrl")
+    return {}, None
+
+def extract_generic_meta(url, html=None):
+    if html is None:
+        html = get_session().get(url, headers=get_headers(), timeout=5).text
+    title, meta = parse_head_meta(html)
+    details = {}
+    if title and title.strip(): details["Título"] = title.strip()[:50]
+    if meta.get("og:description"): details["Descripción"] = meta["og:description"].strip()[:200]
+    return details, meta.get("og:image")
+
+class ExtractWorker:
+    """Un proceso de extract_worker.py: petición y respuesta JSON por línea sobre stdin/stdout"""
+    def __init__(self, command):
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read, name="wmn-extract-reader", daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout: self._replies.put(line)
+        self._replies.put(None)
+
+    def call(self, html, timeout):
+        """Resultado de socid-extractor; queue.Empty si no contesta en `timeout` segundos"""
+        self.proc.stdin.write(json.dumps({"html": html}, ensure_ascii=False) + "\n")
+        self.proc.stdin.flush()
+        line = self._replies.get(timeout=timeout)
+        if line is None: raise BrokenPipeError("el trabajador de extracción terminó")
+        reply = json.loads(line)
+        if "error" in reply: raise RuntimeError(reply["error"])
+        return reply["data"]
+
+    def kill(self):
+        self.proc.kill()
+        for f in (self.proc.stdin, self.proc.stdout):
+            try: f.close()
+            except OSError: pass
+        self.proc.wait()
+
+class ExtractPool:
+    """Trabajadores acotados para el parseo pesado: no compite por el GIL con los hilos de red.
+
+    Cada trabajador es un proceso que ejecuta extract_worker.py, un script aparte:
+    no vuelve a ejecutar main.py ni toca el __main__ de este proceso, y no hereda
+    hilos (Streamlit, motores) como haría un fork. Un trabajador que se pasa de
+    EXTRACT_TIMEOUT se mata y el siguiente pedido arranca uno nuevo; si uno muere,
+    esa llamada se hace en el hilo.
+    """
+    def __init__(self, workers, command=None):
+        self.workers = workers
+        self.command = command or [sys.executable, EXTRACT_WORKER_PATH]
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(workers, 1))
+        self._live = set()
+        self._lock = threading.Lock()
+
+    def extract(self, html):
+        if self.workers <= 0: return socid_extract(html)
+        if not self._slots.acquire(timeout=EXTRACT_TIMEOUT):
+            raise TimeoutError("extracción: todos los trabajadores ocupados")
+        worker = None
+        try:
+            try:
+                try: worker = self._idle.get_nowait()
+                except queue.Empty: worker = self._spawn()
+                return worker.call(html, EXTRACT_TIMEOUT)
+            except queue.Empty:
+                self._discard(worker)
+                worker = None
+                raise TimeoutError(f"extracción de más de {EXTRACT_TIMEOUT} s: trabajador reemplazado")
+            except (OSError, ValueError) as e:
+                log.warning("Trabajador de extracción caído (%r); se reemplaza", e)
+                self._discard(worker)
+                worker = None
+                return socid_extract(html)
+        finally:
+            if worker is not None: self._idle.put(worker)
+            self._slots.release()
+
+    def _spawn(self):
+        worker = ExtractWorker(self.command)
+        with self._lock: self._live.add(worker)
+        return worker
+
+    def _discard(self, worker):
+        if worker is None: return
+        with self._lock: self._live.discard(worker)
+        worker.kill()
+
+    def close(self):
+        with self._lock: workers, self._live = list(self._live), set()
+        for worker in workers: worker.kill()
+
+@shared_resource
+def get_extract_pool():
+    pool = ExtractPool(EXTRACT_WORKERS)
+    atexit.register(pool.close)
+    return pool
+
+def extract_generic(username, body=None, uri=None):
+    """Extractor por defecto: meta/OpenGraph y, si no hay nada, socid-extractor"""
+    details, image_url = extract_generic_meta(uri, body)
+    if not details and socid_extract and body:
+        # socid-extractor trabaja sobre el HTML de la página, no sobre la URL
+        data = get_extract_pool().extract(body)
+        if data:
+            details = {k: v for k, v in data.items() if v and k != 'image'}
+            image_url = data.get('image')
+    return details, image_url
+
+# Extractores especiales por nombre de sitio (en orden de prioridad)
+SPECIAL_EXTRACTORS = (
+    ("telegram", extract_telegram),
+    ("gitlab", extract_gitlab),
+    ("github", extract_github),
+    ("gravatar", extract_gravatar),
+)
+
+def resolve_extractor(site_name):
+    site_name = site_name.lower()
+    for key, handler in SPECIAL_EXTRACTORS:
+        if key in site_name: return handler
+    return extract_generic
+
+def url_host(url):
+    """Origen (host[:puerto]) de una URL: la unidad para limitar y agrupar peticiones"""
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+def favicon_url(domain):
+    """Favicon de respaldo: una sola URL por dominio, así la caché de imágenes lo comparte entre escaneos"""
+    return FAVICON_URL.format(domain=domain.split(':')[0].lower())
+
+def site_uri(site, username):
+    """URL de verificación; usa la plantilla precompilada del índice si existe"""
+    parts = site.get('uri_parts')
+    if parts: return username.join(parts)
+    return site['uri_check'].format(account=username)
+
+def extract_details(site, username, uri, body=None, trace=None):
+    """Extrae detalles e imagen de un perfil ya confirmado.
+
+    `body` es el cuerpo de la respuesta de check_site: se reutiliza para los
+    parsers meta/OpenGraph/socid y solo se hacen llamadas extra a una API
+    cuando la página no contiene los datos que necesita el extractor.
+
+    Si el extractor falla o no saca ningún dato (p. ej. la API de GitHub
+    devolviendo 403 por límite de peticiones) el resultado lleva
+    `extract_failed`: el perfil existe, pero sus detalles no sirven para
+    compararlos con escaneos anteriores.
+    """
+    handler = site.get('extractor') or resolve_extractor(site['name'])
+    try: details, image_url = handler(username, body, uri)
+    except Exception as e:
+        # El perfil existe igualmente: se entrega sin detalles y el fallo queda en las métricas
+        category = classify_error(e)
+        if trace is not None: trace.error("parse_error" if category == "error" else category)
+        log.debug("Extracción fallida en %s: %r", site['name'], e)
+        details, image_url = {}, None
+    failed = not details and not image_url
+
+    if image_url:
+        # og:image relativo ("/avatar.png") se resuelve contra la URL del perfil
+        image_url = urllib.parse.urljoin(uri, image_url)
+    else:
+        try: image_url = favicon_url(uri.split('/')[2])
+        except: image_url = "https://via.placeholder.com/128?text=Found"
+
+    res = {"name": site['name'], "uri": uri, "category": site['cat'], "status": FOUND, "image": image_url, "details": details}
+    if failed: res['extract_failed'] = True
+    return res
+
+class BodyMatcher:
+    """Decide el veredicto de un sitio leyendo el cuerpo por trozos.
+
+    Busca e_string / m_string como bytes, guardando una cola entre trozos para no
+    perder marcadores partidos, y deja de leer en cuanto hay veredicto o se llega
+    al tope de bytes del sitio. Si el código HTTP ya decide, no lee nada para el
+    veredicto; con un perfil confirmado solo sigue hasta </head> para la extracción.
+    """
+    def __init__(self, site, status):
+        e_string, m_string = site.get('e_string'), site.get('m_string')
+        self.e_marker = e_string.encode('utf-8') if e_string else None
+        self.m_marker = m_string.encode('utf-8') if m_string and status == site.get('m_code') else None
+        self.cap = site.get('max_bytes') or MAX_BODY_BYTES
+        # True = perfil encontrado, False = no existe, None = hace falta leer más
+        if status != site['e_code']: self.verdict = False
+        elif not self.e_marker: self.verdict = True
+        else: self.verdict = None
+        self.head = bytearray()
+        self.head_done = False
+        self.bytes_read = 0
+        self._tail = b""
+        self._overlap = max(len(self.e_marker or b""), len(self.m_marker or b""), len(b"</head>")) - 1
+
+    def needs_body(self):
+        if self.verdict is False: return False
+        if self.verdict is True: return not self.head_done and len(self.head) < EXTRACT_BYTE_CAP
+        return self.bytes_read < self.cap
+
+    def feed(self, chunk):
+        self.bytes_read += len(chunk)
+        if len(self.head) < EXTRACT_BYTE_CAP:
+            self.head += chunk[:EXTRACT_BYTE_CAP - len(self.head)]
+        window = self._tail + chunk
+        if self.verdict is None:
+            if self.e_marker in window: self.verdict = True
+            elif self.m_marker and self.m_marker in window: self.verdict = False
+        if not self.head_done and b"</head>" in window.lower():
+            self.head_done = True
+        self._tail = window[-self._overlap:] if self._overlap else b""
+
+    def can_drain(self, headers):
+        """¿Quedan tan pocos bytes que conviene terminar de leer y reutilizar la conexión?"""
+        try: return int(headers.get('Content-Length')) - self.bytes_read <= KEEPALIVE_DRAIN_BYTES
+        except: return False
+
+    def text(self, encoding=None):
+        return bytes(self.head).decode(encoding or 'utf-8', errors='replace')
+
+class HostRateLimiter:
+    """Token bucket por host.
+
+    reserve() no bloquea: devuelve los segundos que hay que esperar, así sirve
+    igual para hilos (time.sleep) que para corrutinas (asyncio.sleep).
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # host -> (fichas, último instante, bloqueado hasta)
+        self._lock = threading.Lock()
+
+    def reserve(self, host):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, blocked_until = self._buckets.get(host, (self.burst, now, 0.0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now, blocked_until)
+        return max(0.0, -tokens / self.rate, blocked_until - now)
+
+    def penalize(self, host, seconds):
+        """El host pidió frenar (429/503 o Retry-After): todas sus verificaciones esperan"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, blocked_until = self._buckets.get(host, (self.burst, now, 0.0))
+            self._buckets[host] = (tokens, last, max(blocked_until, now + seconds))
+
+class RetryBudget:
+    """Presupuesto global de reintentos: cada petición aporta `ratio` fichas y cada
+    reintento gasta una, así una caída masiva no multiplica el tráfico."""
+    def __init__(self, ratio, min_tokens, max_tokens):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self._tokens < 1: return False
+            self._tokens -= 1
+            return True
+
+class SiteHealth:
+    """Modelo de salud por sitio a partir de las verificaciones ya hechas.
+
+    Guarda las últimas latencias de red de cada sitio para fijar su timeout por
+    percentiles y ordenar los escaneos (los más lentos primero, para que se
+    solapen con los rápidos). Tras QUARANTINE_AFTER fallos de red seguidos el
+    sitio entra en cuarentena: los escaneos lo marcan inconcluso sin tocar la red
+    y un hilo lo vuelve a sondear hasta que responda.
+    """
+    def __init__(self, probe=None):
+        self.probe = probe
+        self._latencies = {}  # sitio -> deque de segundos
+        self._failures = {}   # sitio -> fallos seguidos
+        self._quarantine = {} # sitio -> (hasta, nº de cuarentenas, site)
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def record(self, site, trace):
+        """Suma una verificación terminada (sin contar las saltadas por cuarentena)"""
+        if not trace.attempts: return
+        name = site['name']
+        failed = trace.outcome == INCONCLUSIVE and bool(trace.errors) and trace.errors[-1] in HEALTH_FAILURES
+        with self._lock:
+            if failed:
+                self._failures[name] = failures = self._failures.get(name, 0) + 1
+                if failures >= QUARANTINE_AFTER and name not in self._quarantine:
+                    self._enter_quarantine(site, 0)
+            elif trace.outcome != INCONCLUSIVE:
+                network = trace.total - trace.phases["wait"] - trace.phases["extraction"]
+                self._latencies.setdefault(name, deque(maxlen=HEALTH_WINDOW)).append(network)
+                self._failures.pop(name, None)
+                self._quarantine.pop(name, None)
+
+    def _enter_quarantine(self, site, strikes):
+        seconds = min(QUARANTINE_MAX, QUARANTINE_BASE * (2 ** strikes))
+        self._quarantine[site['name']] = (time.monotonic() + seconds, strikes, site)
+        log.info("Sitio en cuarentena %ss: %s", seconds, site['name'])
+        if self.probe and self._prober is None:
+            self._prober = threading.Thread(target=self._probe_loop, name="wmn-health-probe", daemon=True)
+            self._prober.start()
+
+    def is_quarantined(self, name):
+        return name in self._quarantine
+
+    def quarantined(self):
+        with self._lock:
+            return sorted(self._quarantine)
+
+    def percentile(self, name, q):
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if len(samples) < HEALTH_MIN_SAMPLES: return None
+        return samples[min(len(samples) - 1, int(q * (len(samples) - 1) + 0.5))]
+
+    def timeout_for(self, name):
+        p95 = self.percentile(name, 0.95)
+        if p95 is None: return CHECK_TIMEOUT
+        return min(CHECK_TIMEOUT, max(ADAPTIVE_TIMEOUT_MIN, p95 * ADAPTIVE_TIMEOUT_FACTOR))
+
+    def slowest_first(self, target_sites):
+        """Ordena por latencia mediana descendente; los sitios sin historial van en medio"""
+        with self._lock:
+            medians = {name: sorted(v)[len(v) // 2] for name, v in self._latencies.items() if v}
+        default = sorted(medians.values())[len(medians) // 2] if medians else 0.0
+        return sorted(target_sites, key=lambda site: medians.get(site['name'], default), reverse=True)
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(QUARANTINE_PROBE_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                due = [(until, strikes, site) for until, strikes, site in self._quarantine.values() if until <= now]
+            for _, strikes, site in due:
+                try: alive = self.probe(site)
+                except Exception: alive = False
+                with self._lock:
+                    if site['name'] not in self._quarantine: continue
+                    if alive:
+                        log.info("Sitio recuperado: %s", site['name'])
+                        self._quarantine.pop(site['name'], None)
+                        self._failures.pop(site['name'], None)
+                    else:
+                        self._enter_quarantine(site, strikes + 1)
+
+def probe_site(site):
+    """Sondeo de un sitio en cuarentena con un usuario conocido del catálogo: vale cualquier respuesta concluyente"""
+    username = (site.get('known') or ["whatsmyname"])[0]
+    verdict = fetch_verdict(site, site_uri(site, username), CheckTrace(site['name']))[0]
+    return verdict is not None and verdict is not INCONCLUSIVE
+
+@shared_resource
+def get_site_health():
+    return SiteHealth(probe_site)
+
+@shared_resource
+def get_rate_limiter():
+    return HostRateLimiter(HOST_RATE, HOST_BURST)
+
+@shared_resource
+def get_retry_budget():
+    return RetryBudget(RETRY_BUDGET_RATIO, 20, 500)
+
+def parse_retry_after(value):
+    """Retry-After en segundos o como fecha HTTP; None si no viene o no se entiende"""
+    if not value: return None
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    try: return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except: return None
+
+def plan_retry(attempt, host, status=None, retry_after=None):
+    """Segundos a esperar antes del siguiente intento, o None si hay que rendirse"""
+    if attempt >= MAX_RETRIES: return None
+    delay = retry_after if retry_after is not None else RETRY_BACKOFF_BASE * (2 ** attempt) * random.uniform(1, 1.5)
+    if delay > RETRY_AFTER_MAX or not get_retry_budget().spend(): return None
+    if status in THROTTLE_STATUSES:
+        # La limitación es de todo el host: la espera se aplica en el limitador
+        get_rate_limiter().penalize(host, delay)
+        return 0
+    return delay
+
+def inconclusive_result(site, uri, reason):
+    return {"name": site['name'], "uri": uri, "category": site['cat'], "status": INCONCLUSIVE, "reason": reason}
+
+def not_found_record(site, username, catalog_version=None):
+    """Registro explícito de "no existe" (el motor lo representa como None)"""
+    return {"name": site['name'], "uri": site_uri(site, username), "category": site['cat'],
+            "status": NOT_FOUND, "username": username, "catalog_version": catalog_version}
+
+def is_hit(res):
+    return res is not None and res.get('status') == FOUND
+
+def classify_error(exc):
+    """Categoría de un fallo de red o de parseo, para motivos de inconcluso y métricas"""
+    if isinstance(exc, (requests.Timeout, asyncio.TimeoutError)): return "timeout"
+    if isinstance(exc, requests.exceptions.SSLError) or (aiohttp and isinstance(exc, aiohttp.ClientSSLError)): return "tls_error"
+    text = repr(exc)
+    if "NameResolution" in text or "gaierror" in text or "DNSError" in text: return "dns_error"
+    if isinstance(exc, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)): return "connection_error"
+    if aiohttp and isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)): return "connection_error"
+    if isinstance(exc, (ValueError, KeyError, IndexError, TypeError, AttributeError)): return "parse_error"
+    return "error"
+
+def status_category(status):
+    return "throttled" if status in THROTTLE_STATUSES else "http_error"
+
+def finish_check(site, trace, res):
+    """Cierra la traza de la verificación y la suma a las métricas y a la salud del sitio"""
+    trace.finish(res['status'] if res else NOT_FOUND, res.get('reason') if res else None)
+    METRICS.record(trace)
+    get_site_health().record(site, trace)
+    return res
+
+def fetch_verdict(site, uri, trace):
+    """Un intento de verificación: (veredicto, cuerpo, estado HTTP, Retry-After, motivo).
+
+    Veredicto None = fallo transitorio que merece reintento; INCONCLUSIVE = error
+    que no se arregla reintentando. requests no expone DNS/conexión por separado:
+    todo lo previo a las cabeceras cuenta como "first_byte".
+    """
+    start = time.perf_counter()
+    trace.attempts += 1
+    try:
+        timeout = get_site_health().timeout_for(site['name'])
+        with get_session().get(uri, headers=get_headers(), timeout=timeout, stream=True) as r:
+            headers_at = time.perf_counter()
+            trace.add("first_byte", headers_at - start)
+            if r.status_code in RETRY_STATUSES and r.status_code != site['e_code']:
+                trace.error(status_category(r.status_code))
+                return None, None, r.status_code, parse_retry_after(r.headers.get('Retry-After')), f"HTTP {r.status_code}"
+            matcher = BodyMatcher(site, r.status_code)
+            try:
+                if matcher.needs_body():
+                    for chunk in r.iter_content(STREAM_CHUNK):
+                        matcher.feed(chunk)
+                        if not matcher.needs_body(): break
+                if matcher.can_drain(r.headers):
+                    for _ in r.iter_content(STREAM_CHUNK): pass
+            finally:
+                trace.add("body", time.perf_counter() - headers_at)
+                trace.bytes += matcher.bytes_read
+            if not matcher.verdict: return False, None, r.status_code, None, None
+            # requests asume ISO-8859-1 si el servidor no declara charset; preferimos UTF-8
+            charset = r.encoding if 'charset' in r.headers.get('Content-Type', '').lower() else None
+            return True, matcher.text(charset), r.status_code, None, None
+    except (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+        category = classify_error(e)
+        trace.error(category)
+        return None, None, None, None, category
+    except Exception as e:
+        # Errores no transitorios (URL inválida, etc.): no se reintenta
+        category = classify_error(e)
+        trace.error(category)
+        log.debug("Fallo no transitorio en %s: %r", uri, e)
+        return INCONCLUSIVE, None, None, None, category
+
+def check_site(site, username, trace=None):
+    trace = trace or CheckTrace(site['name'])
+    uri = site_uri(site, username)
+    if get_site_health().is_quarantined(site['name']):
+        return finish_check(site, trace, inconclusive_result(site, uri, "quarantined"))
+    host = site.get('host') or url_host(uri)
+    for attempt in itertools.count():
+        delay = get_rate_limiter().reserve(host)
+        time.sleep(delay)
+        trace.add("wait", delay)
+        get_retry_budget().record_request()
+        verdict, body, status, retry_after, reason = fetch_verdict(site, uri, trace)
+        if verdict is INCONCLUSIVE: return finish_check(site, trace, inconclusive_result(site, uri, reason))
+        if verdict is not None: break
+        delay = plan_retry(attempt, host, status, retry_after)
+        if delay is None: return finish_check(site, trace, inconclusive_result(site, uri, reason))
+        time.sleep(delay)
+        trace.add("wait", delay)
+
+    if not verdict: return finish_check(site, trace, None)
+    start = time.perf_counter()
+    res = extract_details(site, username, uri, body, trace)
+    trace.add("extraction", time.perf_counter() - start)
+    return finish_check(site, trace, res)
+
+def build_trace_config():
+    """TraceConfig de aiohttp que reparte el tiempo de conexión en "dns" y "connect" (TCP + TLS)"""
+    async def dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def dns_end(session, ctx, params):
+        ctx.dns_elapsed = time.perf_counter() - ctx.dns_start
+        if ctx.trace_request_ctx is not None: ctx.trace_request_ctx.add("dns", ctx.dns_elapsed)
+
+    async def connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+        ctx.dns_elapsed = 0.0
+
+    async def connect_end(session, ctx, params):
+        # La resolución DNS ocurre dentro de la creación de la conexión
+        elapsed = time.perf_counter() - ctx.connect_start - ctx.dns_elapsed
+        if ctx.trace_request_ctx is not None: ctx.trace_request_ctx.add("connect", elapsed)
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(dns_start)
+    config.on_dns_resolvehost_end.append(dns_end)
+    config.on_connection_create_start.append(connect_start)
+    config.on_connection_create_end.append(connect_end)
+    return config
+
+async def fetch_verdict_async(session, site, uri, trace):
+    """Equivalente asyncio de fetch_verdict; DNS y conexión llegan por el TraceConfig de la sesión"""
+    start = time.perf_counter()
+    setup_before = trace.phases["dns"] + trace.phases["connect"]
+    trace.attempts += 1
+    try:
+        timeout = aiohttp.ClientTimeout(total=get_site_health().timeout_for(site['name']))
+        async with session.get(uri, timeout=timeout, trace_request_ctx=trace) as r:
+            headers_at = time.perf_counter()
+            setup = trace.phases["dns"] + trace.phases["connect"] - setup_before
+            trace.add("first_byte", headers_at - start - setup)
+            if r.status in RETRY_STATUSES and r.status != site['e_code']:
+                trace.error(status_category(r.status))
+                return None, None, r.status, parse_retry_after(r.headers.get('Retry-After')), f"HTTP {r.status}"
+            matcher = BodyMatcher(site, r.status)
+            try:
+                if matcher.needs_body():
+                    async for chunk in r.content.iter_chunked(STREAM_CHUNK):
+                        matcher.feed(chunk)
+                        if not matcher.needs_body(): break
+                if matcher.can_drain(r.headers):
+                    await r.content.read()
+            finally:
+                trace.add("body", time.perf_counter() - headers_at)
+                trace.bytes += matcher.bytes_read
+            if not matcher.verdict: return False, None, r.status, None, None
+            return True, matcher.text(r.charset), r.status, None, None
+    except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+        category = classify_error(e)
+        trace.error(category)
+        return None, None, None, None, category
+    except Exception as e:
+        category = classify_error(e)
+        trace.error(category)
+        log.debug("Fallo no transitorio en %s: %r", uri, e)
+        return INCONCLUSIVE, None, None, None, category
+
+async def check_site_async(session, site, username, semaphore=None, trace=None):
+    """Versión asyncio de check_site: la espera de red no ocupa ningún hilo.
+
+    El semáforo global solo se retiene durante la petición, no en las esperas
+    del limitador ni en los backoffs.
+    """
+    trace = trace or CheckTrace(site['name'])
+    uri = site_uri(site, username)
+    if get_site_health().is_quarantined(site['name']):
+        return finish_check(site, trace, inconclusive_result(site, uri, "quarantined"))
+    host = site.get('host') or url_host(uri)
+    for attempt in itertools.count():
+        delay = get_rate_limiter().reserve(host)
+        await asyncio.sleep(delay)
+        trace.add("wait", delay)
+        get_retry_budget().record_request()
+        async with semaphore or contextlib.nullcontext():
+            verdict, body, status, retry_after, reason = await fetch_verdict_async(session, site, uri, trace)
+        if verdict is INCONCLUSIVE: return finish_check(site, trace, inconclusive_result(site, uri, reason))
+        if verdict is not None: break
+        delay = plan_retry(attempt, host, status, retry_after)
+        if delay is None: return finish_check(site, trace, inconclusive_result(site, uri, reason))
+        await asyncio.sleep(delay)
+        trace.add("wait", delay)
+
+    if not verdict: return finish_check(site, trace, None)
+    # La extracción de detalles sigue siendo bloqueante: se delega al executor del bucle
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    res = await loop.run_in_executor(None, extract_details, site, username, uri, body, trace)
+    trace.add("extraction", time.perf_counter() - start)
+    return finish_check(site, trace, res)
+
+class ThreadScanEngine:
+    """Motor clásico: un hilo por verificación en vuelo, sobre la sesión compartida"""
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, site, username):
+        # La traza viaja en el future para que run_checks la sume a las métricas del escaneo
+        trace = CheckTrace(site['name'])
+        future = self.executor.submit(check_site, site, username, trace)
+        future.trace = trace
+        return future
+
+class AsyncScanEngine:
+    """Bucle asyncio persistente en su propio hilo con un ClientSession compartido.
+
+    Cientos de verificaciones quedan en vuelo a la vez; el conector limita el total
+    y las conexiones por host, y las conexiones keep-alive se reutilizan entre escaneos.
+    """
+    def __init__(self, max_concurrency, max_per_host):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self._session = None
+        self._semaphore = None
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="wmn-async-engine", daemon=True)
+        self._thread.start()
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_per_host, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers=get_headers(), trace_configs=[build_trace_config()])
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _check(self, site, username, trace):
+        session = await self._get_session()
+        return await check_site_async(session, site, username, self._semaphore, trace)
+
+    def submit(self, site, username):
+        # Devuelve un concurrent.futures.Future: compatible con wait/as_completed
+        trace = CheckTrace(site['name'])
+        future = asyncio.run_coroutine_threadsafe(self._check(site, username, trace), self.loop)
+        future.trace = trace
+        return future
+
+    def close(self):
+        """Cierra la sesión y detiene el bucle (al salir del proceso)"""
+        if self._session is not None and not self._session.closed:
+            try: asyncio.run_coroutine_threadsafe(self._session.close(), self.loop).result(timeout=5)
+            except Exception: pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+@shared_resource
+def get_scan_engine(kind=SCAN_ENGINE):
+    if kind == "async" and aiohttp is not None:
+        engine = AsyncScanEngine(MAX_CONCURRENCY, MAX_PER_HOST)
+        atexit.register(engine.close)
+        return engine
+    return ThreadScanEngine(min(MAX_CONCURRENCY, 32))
+
+def normalize_username(username):
+    return unicodedata.normalize("NFC", username.strip().lstrip("@")).casefold()
+
+class ResultCache:
+    """Caché TTL + LRU de verificaciones por (versión de catálogo, sitio, usuario normalizado).
+
+    Guarda hallazgos y "no existe"; los inconclusos nunca se cachean para que se
+    reintenten. La clave lleva la huella de las reglas del sitio, no la del catálogo
+    entero: cambiar otra entrada de wmn-data.json no invalida lo ya verificado. Con `db_path` usa además un SQLite compartido entre sesiones y entre
+    réplicas del mismo host (WAL no funciona sobre sistemas de archivos de red).
+    Las escrituras se agrupan: otro proceso las ve tras la siguiente tanda (a lo sumo
+    RESULT_CACHE_COMMIT_INTERVAL segundos o al terminar el escaneo). Un SQLite bloqueado
+    o inaccesible no corta el escaneo: la lectura cuenta como fallo de caché y la
+    escritura se omite.
+    """
+    MISS = object()
+
+    def __init__(self, ttl, max_entries, db_path=None, timeout=10):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items = OrderedDict()  # clave -> (guardado en, resultado)
+        self._lock = threading.Lock()
+        self._db = None
+        self._pending = []
+        self._last_commit = time.monotonic()
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=timeout, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS result_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM result_cache WHERE stored_at < ?", (time.time() - ttl,))
+
+    @staticmethod
+    def make_key(site, username):
+        return f"{site_fingerprint(site)}|{site['name']}|{normalize_username(username)}"
+
+    def get(self, site, username):
+        key = self.make_key(site, username)
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._items.move_to_end(key)
+                return copy.deepcopy(entry[1])
+            if self._db is not None:
+                try: row = self._db.execute("SELECT value, stored_at FROM result_cache WHERE key = ?", (key,)).fetchone()
+                except sqlite3.OperationalError as e:
+                    log.warning("Caché SQLite no disponible (%s): se verifica en red", e)
+                    return self.MISS
+                if row and now - row[1] < self.ttl:
+                    res = json.loads(row[0])
+                    self._remember(key, row[1], res)
+                    return copy.deepcopy(res)
+        return self.MISS
+
+    def put(self, site, username, res):
+        if res is not None and res.get('status') != FOUND: return
+        if res is not None:
+            res = {k: v for k, v in res.items() if k not in ('username', 'catalog_version')}
+        key = self.make_key(site, username)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, copy.deepcopy(res))
+            if self._db is not None:
+                self._pending.append((key, json.dumps(res, ensure_ascii=False, default=str), now))
+                if (len(self._pending) >= RESULT_CACHE_COMMIT_EVERY
+                        or time.monotonic() - self._last_commit >= RESULT_CACHE_COMMIT_INTERVAL):
+                    self._commit()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        """Escribe la tanda pendiente en una sola transacción corta; si falla, se omite"""
+        self._last_commit = time.monotonic()
+        if not self._pending: return
+        rows, self._pending = self._pending, []
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO result_cache (key, value, stored_at) VALUES (?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction: self._db.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            log.warning("Caché SQLite no disponible (%s): se omiten %d escrituras", e, len(rows))
+
+    def _remember(self, key, stored_at, res):
+        self._items[key] = (stored_at, res)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+@shared_resource
+def get_result_cache():
+    cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_DB)
+    atexit.register(cache.flush)
+    return cache
+
+class ScanControl:
+    """Parada anticipada de un escaneo: cancelación explícita, plazo en segundos y tope de hallazgos.
+
+    run_checks la consulta entre resultados; al parar cancela las verificaciones
+    pendientes (en el motor asyncio también las peticiones en vuelo).
+    """
+    def __init__(self, deadline=None, max_hits=None):
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.max_hits = max_hits or None
+        self.hits = 0
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def cancel(self, reason="cancelled"):
+        if self.reason is None: self.reason = reason
+        self._cancelled.set()
+
+    def remaining(self):
+        if self.deadline is None: return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def observe(self, res):
+        if is_hit(res):
+            self.hits += 1
+            if self.max_hits and self.hits >= self.max_hits: self.cancel("max_hits")
+
+    def stopped(self):
+        if not self._cancelled.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        return self._cancelled.is_set()
+
+def run_checks(jobs, engine=None, catalog_version=None, window=None, cache=None, refresh=False, metrics=None, control=None):
+    """Ejecuta pares (site, username) sobre el motor y entrega (site, username, resultado)
+    según terminan. Solo mantiene `window` futures en vuelo, así que los lotes de
+    cientos de miles de verificaciones no se materializan de golpe en memoria.
+
+    Lo que esté vigente en la caché de resultados se entrega sin tocar la red;
+    con `refresh=True` se ignora la caché al leer pero se sigue actualizando.
+    Con `metrics` (un ScanMetrics) se agregan las trazas de este escaneo y con
+    `control` (un ScanControl) el escaneo puede pararse antes de terminar. Si el
+    consumidor abandona el generador, las verificaciones pendientes se cancelan.
+    """
+    engine = engine or get_scan_engine()
+    cache = cache or get_result_cache()
+    window = window or MAX_CONCURRENCY * 2
+    jobs = iter(jobs)
+    pending = {}
+    ready = deque()
+
+    def stamp(res, username):
+        if res:
+            res['username'] = username
+            if catalog_version: res['catalog_version'] = catalog_version
+        return res
+
+    def fill():
+        while len(pending) < window and len(ready) < window:
+            if control is not None and control.stopped(): return
+            job = next(jobs, None)
+            if job is None: return
+            site, username = job
+            cached = ResultCache.MISS if refresh else cache.get(site, username)
+            if cached is ResultCache.MISS:
+                pending[engine.submit(site, username)] = (site, username)
+            else:
+                if metrics is not None: metrics.record_cache_hit()
+                ready.append((site, username, stamp(cached, username)))
+
+    def stopped():
+        return control is not None and control.stopped()
+
+    try:
+        fill()
+        while (pending or ready) and not stopped():
+            while ready and not stopped():
+                item = ready.popleft()
+                if control is not None: control.observe(item[2])
+                yield item
+            if not pending:
+                fill()
+                continue
+            done, _ = wait(pending, timeout=control.remaining() if control is not None else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                if stopped(): break
+                site, username = pending.pop(future)
+                try: res = future.result()
+                except Exception as e:
+                    log.warning("Verificación fallida en %s: %r", site['name'], e)
+                    res = None
+                trace = getattr(future, 'trace', None)
+                if metrics is not None and trace is not None and trace.outcome is not None: metrics.record(trace)
+                cache.put(site, username, res)
+                if control is not None: control.observe(res)
+                yield site, username, stamp(res, username)
+            fill()
+    finally:
+        # Parada, plazo o generador abandonado (rerun de Streamlit, cliente desconectado)
+        for future in pending: future.cancel()
+        cache.flush()
+
+def interleave_by_host(target_sites):
+    """Reordena los sitios alternando hosts (round-robin) para espaciar las peticiones a cada dominio"""
+    buckets = OrderedDict()
+    for site in target_sites:
+        host = site.get('host') or url_host(site['uri_check'])
+        buckets.setdefault(host, deque()).append(site)
+    queues = deque(buckets.values())
+    ordered = []
+    while queues:
+        queue = queues.popleft()
+        ordered.append(queue.popleft())
+        if queue: queues.append(queue)
+    return ordered
+
+def schedule_sites(target_sites, priority=None):
+    """Orden de envío: primero las categorías de `priority` (en ese orden) y, dentro
+    de cada tramo, los sitios históricamente más lentos primero, intercalados por host"""
+    rank = {cat: i for i, cat in enumerate(priority or ())}
+    tiers = {}
+    for site in target_sites:
+        tiers.setdefault(rank.get(site['cat'], len(rank)), []).append(site)
+    health = get_site_health()
+    return [site for tier in sorted(tiers) for site in interleave_by_host(health.slowest_first(tiers[tier]))]
+
+def scan_batch(usernames, target_sites, engine=None, catalog_version=None, refresh=False, metrics=None, control=None, priority=None):
+    """Escaneo por lotes: todos los (usuario × sitio) por el mismo motor compartido.
+
+    Los sitios se intercalan por host (los más lentos primero) y los usuarios se
+    recorren en orden, de modo que cada objetivo termina en secuencia sin
+    concentrar ráfagas en un dominio.
+    """
+    ordered = schedule_sites(target_sites, priority)
+    jobs = ((site, username) for username in usernames for site in ordered)
+    return run_checks(jobs, engine, catalog_version, refresh=refresh, metrics=metrics, control=control)
+
+def parse_usernames(text):
+    """Lista de usuarios desde texto pegado o archivo (líneas o comas), sin duplicados"""
+    names = []
+    for line in text.splitlines():
+        if line.strip().startswith("#"): continue
+        names.extend(n.strip().lstrip("@") for n in line.split(","))
+    return list(dict.fromkeys(n for n in names if n))
+
+def parse_lines(text):
+    """Una entrada por línea, sin vacías ni duplicadas (URLs o IDs, que pueden llevar comas)"""
+    return list(dict.fromkeys(line.strip() for line in text.splitlines() if line.strip()))
+
+# Variantes de un usuario: separadores entre sus partes, sufijos numéricos y leetspeak
+VARIANT_SEPARATORS = ("", ".", "_", "-")
+VARIANT_SUFFIXES = ("1", "01", "123")
+VARIANT_LEET = str.maketrans({"a": "4", "e": "3", "i": "1", "o": "0", "s": "5", "t": "7"})
+MAX_VARIANTS = int(os.environ.get("WMN_MAX_VARIANTS", "40"))
+# Un usuario que va en el subdominio tiene que ser una etiqueta DNS válida
+HOSTNAME_LABEL = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
+
+def username_tokens(username):
+    """Partes de un usuario: cortes en . _ - y espacios y entre letras y dígitos"""
+    return [t for t in re.split(r"[._\-\s]+|(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])", normalize_username(username)) if t]
+
+def username_variants(seed, max_variants=MAX_VARIANTS):
+    """Candidatos de la misma identidad a partir de una semilla (la semilla siempre primero).
+
+    Las variantes que solo difieren en mayúsculas se consideran la misma: casi
+    todas las plataformas tratan el usuario sin distinguirlas.
+    """
+    tokens = username_tokens(seed)
+    words = [t for t in tokens if not t.isdigit()]
+    numbers = [t for t in tokens if t.isdigit()]
+    joined = [sep.join(tokens) for sep in VARIANT_SEPARATORS]
+    stems = [sep.join(words) for sep in VARIANT_SEPARATORS] if words else []
+    candidates = [seed.strip().lstrip("@"), *joined, *stems]
+    if not numbers: candidates += [stem + suffix for stem in stems[:1] + stems[2:3] for suffix in VARIANT_SUFFIXES]
+    candidates += [c.translate(VARIANT_LEET) for c in joined[:1] + stems[:1]]
+    variants, seen = [], set()
+    for candidate in candidates:
+        key = normalize_username(candidate)
+        if not key or key in seen: continue
+        seen.add(key)
+        variants.append(candidate)
+    return variants[:max_variants]
+
+def plan_variant_checks(variants, target_sites):
+    """Qué variantes hay que verificar en cada sitio: {nombre del sitio: [variantes]}.
+
+    Las repetidas ya las quitó username_variants (sin distinguir mayúsculas); aquí
+    se descartan por sitio las imposibles: con '.' o '_' cuando el usuario va en
+    el subdominio, que tiene que ser una etiqueta DNS válida.
+    """
+    plan = {}
+    for site in target_sites:
+        in_host = "{account}" in urllib.parse.urlsplit(site['uri_check']).netloc
+        for variant in variants:
+            if in_host and not HOSTNAME_LABEL.match(normalize_username(variant)): continue
+            plan.setdefault(site['name'], []).append(variant)
+    return plan
+
+def scan_variants(variants, target_sites, engine=None, catalog_version=None, refresh=False, metrics=None, control=None, priority=None):
+    """Todas las variantes como un único lote por el motor compartido: (sitio, variante, resultado).
+
+    Se recorre variante a variante sobre el mismo orden de sitios que scan_batch,
+    saltando los pares que plan_variant_checks descartó.
+    """
+    ordered = schedule_sites(target_sites, priority)
+    plan = {name: set(names) for name, names in plan_variant_checks(variants, ordered).items()}
+    jobs = ((site, variant) for variant in variants for site in ordered if variant in plan.get(site['name'], ()))
+    return run_checks(jobs, engine, catalog_version, refresh=refresh, metrics=metrics, control=control)
+
+def rank_variants(hits, variants):
+    """Ranking de variantes por sus hallazgos. Un sitio que da positivo para muchas
+    variantes a la vez suele aceptar cualquier usuario, así que cada hallazgo pesa
+    1 / (variantes con hallazgo en ese sitio)."""
+    by_site = {}
+    for res in hits:
+        by_site.setdefault(res['name'], set()).add(res['username'])
+    ranking = {v: {"username": v, "hits": 0, "score": 0.0, "sites": []} for v in variants}
+    for site, found_for in by_site.items():
+        for variant in found_for:
+            entry = ranking.setdefault(variant, {"username": variant, "hits": 0, "score": 0.0, "sites": []})
+            entry["hits"] += 1
+            entry["score"] += 1 / len(found_for)
+            entry["sites"].append(site)
+    order = {v: i for i, v in enumerate(variants)}
+    for entry in ranking.values():
+        entry["score"] = round(entry["score"], 2)
+        entry["sites"].sort()
+    return sorted(ranking.values(), key=lambda e: (-e["score"], -e["hits"], order.get(e["username"], len(order))))
+
+# --- 2. MÓDULO DE CORREO ---
+# Sondas por dirección en un pool compartido y direcciones en vuelo a la vez en modo masivo
+EMAIL_WORKERS = int(os.environ.get("WMN_EMAIL_WORKERS", "32"))
+EMAIL_WINDOW = 64
+MX_CACHE_SIZE = 10000
+MX_TIMEOUT = 5
+
+class MXLookup:
+    """¿Tiene el dominio servidor de correo? Una sola consulta por dominio.
+
+    La caché LRU de dnspython respeta el TTL de cada respuesta (también las
+    negativas: NXDOMAIN y sin registros MX) y las consultas simultáneas al mismo
+    dominio esperan a la que ya está en vuelo.
+    """
+    def __init__(self):
+        import dns.resolver  # solo la pestaña de correo lo necesita
+        self.resolver = dns.resolver.Resolver()
+        self.resolver.cache = dns.resolver.LRUCache(MX_CACHE_SIZE)
+        self.resolver.lifetime = MX_TIMEOUT
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def has_mx(self, domain):
+        domain = domain.lower()
+        with self._lock:
+            event = self._inflight.get(domain)
+            owner = event is None
+            if owner: event = self._inflight[domain] = threading.Event()
+        if not owner:
+            event.wait(MX_TIMEOUT * 2)
+        try:
+            self.resolver.resolve(domain, 'MX')
+            return True
+        except Exception:
+            return False
+        finally:
+            if owner:
+                with self._lock: self._inflight.pop(domain, None)
+                event.set()
+
+@shared_resource
+def get_mx_lookup():
+    return MXLookup()
+
+@shared_resource
+def get_email_pool():
+    return ThreadPoolExecutor(max_workers=EMAIL_WORKERS, thread_name_prefix="wmn-email")
+
+def probe_gravatar(email):
+    email_hash = hashlib.md5(email.lower().encode('utf-8')).hexdigest()
+    try:
+        r = get_session().get(f"https://en.gravatar.com/{email_hash}.json", headers=get_headers(), timeout=5)
+        if r.status_code != 200: return {'found': False}
+        data = r.json()['entry'][0]
+        return {'found': True, 'profile': data.get('profileUrl'), 'image': data.get('thumbnailUrl'), 'name': data.get('displayName'), 'location': data.get('currentLocation')}
+    except Exception as e:
+        log.debug("Gravatar falló para %s: %r", email, e)
+        return {'found': False}
+
+def probe_duolingo(email):
+    try:
+        r = get_session().get(f"https://www.duolingo.com/2017-06-30/users?email={urllib.parse.quote(email)}", headers=get_headers(), timeout=5)
+        users = r.json().get('users') if r.status_code == 200 else None
+        if not users: return None
+        user = users[0]
+        return {"image": user.get("picture") + "/xxlarge" if user.get("picture") else None, "username": user.get("username"), "learning": [c['title'] for c in user.get("courses", [])]}
+    except Exception as e:
+        log.debug("Duolingo falló para %s: %r", email, e)
+        return None
+
+def analyze_emails(addresses, window=None):
+    """Análisis masivo: entrega un resultado por dirección según terminan sus sondas.
+
+    El MX, Gravatar y Duolingo de cada dirección corren a la vez en el pool de
+    correo; el MX se resuelve una vez por dominio. Solo hay `window` direcciones
+    en vuelo, así que miles de direcciones no se materializan de golpe.
+    """
+    from email_validator import validate_email, EmailNotValidError
+    pool = get_email_pool()
+    mx = get_mx_lookup()
+    window = window or EMAIL_WINDOW
+    addresses = iter(addresses)
+    pending = {}  # future -> (resultado, clave)
+    left = {}     # id(resultado) -> sondas pendientes
+    ready = deque()
+
+    def start(address):
+        results = {'email': address}
+        try:
+            email = validate_email(address, check_deliverability=False).normalized
+        except EmailNotValidError as e:
+            ready.append(dict(results, valid_format=False, error=str(e)))
+            return
+        results['valid_format'] = True
+        results['username_part'], results['domain'] = email.rsplit('@', 1)
+        probes = (('has_mail_server', mx.has_mx, results['domain']), ('gravatar', probe_gravatar, email), ('duolingo', probe_duolingo, email))
+        left[id(results)] = len(probes)
+        for key, func, arg in probes:
+            pending[pool.submit(func, arg)] = (results, key)
+
+    def fill():
+        while len(left) < window:
+            address = next(addresses, None)
+            if address is None: return
+            start(address)
+
+    try:
+        fill()
+        while pending or ready:
+            while ready: yield ready.popleft()
+            if not pending:
+                fill()
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, key = pending.pop(future)
+                try: value = future.result()
+                except Exception: value = None
+                if value is not None: results[key] = value
+                left[id(results)] -= 1
+                if not left[id(results)]:
+                    del left[id(results)]
+                    yield results
+            fill()
+    finally:
+        for future in pending: future.cancel()
+
+def analyze_email(email):
+    return next(analyze_emails([email]))
+
+# --- 3. MÓDULOS DE FECHA (MEJORADOS CON ZONA HORARIA) ---
+# Los IDs llevan la marca de tiempo en los bits altos: TikTok, segundos en los
+# 32 superiores; LinkedIn, milisegundos en los 41 superiores (id >> 22).
+# Un ID cuya fecha es anterior al lanzamiento de la plataforma no es un ID suyo
+TIKTOK_ID_PATTERN = r'(?:/video/|/photo/|^)(\d{18,19})(?!\d)'
+LINKEDIN_ID_PATTERN = r'(?<!\d)(\d{19})(?!\d)'
+TIKTOK_SHIFT = 32
+LINKEDIN_SHIFT = 22
+TIKTOK_MIN_TIMESTAMP = 1472688000  # 2016-09-01, en segundos
+LINKEDIN_MIN_TIMESTAMP = 1052092800000  # 2003-05-05, en milisegundos
+
+def extract_tiktok_date(url):
+    """Devuelve la fecha UTC y el timestamp puro"""
+    match = re.search(TIKTOK_ID_PATTERN, url.strip())
+    if not match: return None
+    stamp = int(match.group(1)) >> TIKTOK_SHIFT
+    if stamp < TIKTOK_MIN_TIMESTAMP: return None
+    return datetime.fromtimestamp(stamp, timezone.utc)
+
+def extract_linkedin_date(url):
+    """Devuelve la fecha UTC y el timestamp puro"""
+    match = re.search(LINKEDIN_ID_PATTERN, url)
+    if not match: return None
+    stamp = int(match.group(1)) >> LINKEDIN_SHIFT
+    if stamp < LINKEDIN_MIN_TIMESTAMP: return None
+    return datetime.fromtimestamp(stamp / 1000.0, timezone.utc)
+
+def decode_id_dates(values, pattern, shift, unit, tz=None, min_stamp=0):
+    """Decodifica en bloque IDs con la fecha en los bits altos (URLs o IDs sueltos).
+
+    Extrae los IDs con una sola pasada de regex, desplaza los bits sobre un array
+    uint64 y convierte a fechas (y a la zona `tz`) de forma vectorizada. Devuelve
+    la línea de tiempo ordenada; las entradas sin ID válido (o con una marca anterior
+    a `min_stamp`) quedan al final sin fecha.
+    """
+    import numpy as np
+    import pandas as pd
+    frame = pd.DataFrame({"entrada": pd.Series(list(values), dtype=object)})
+    ids = frame["entrada"].astype(str).str.strip().str.extract(pattern, expand=False)
+    valid = ids.notna().to_numpy()
+    raw = np.zeros(len(frame), dtype=np.uint64)
+    raw[valid] = ids[valid].astype(np.uint64).to_numpy()
+    stamps = pd.Series((raw >> np.uint64(shift)).astype(np.int64))
+    valid = valid & (stamps >= min_stamp).to_numpy()
+    frame["id"] = ids
+    frame["fecha_utc"] = pd.to_datetime(stamps.where(valid), unit=unit, utc=True)
+    if tz: frame["fecha_local"] = frame["fecha_utc"].dt.tz_convert(tz)
+    return frame.sort_values("fecha_utc", na_position="last", kind="stable").reset_index(drop=True)
+
+def decode_tiktok_dates(values, tz=None):
+    return decode_id_dates(values, TIKTOK_ID_PATTERN, TIKTOK_SHIFT, "s", tz, TIKTOK_MIN_TIMESTAMP)
+
+def decode_linkedin_dates(values, tz=None):
+    return decode_id_dates(values, LINKEDIN_ID_PATTERN, LINKEDIN_SHIFT, "ms", tz, LINKEDIN_MIN_TIMESTAMP)
+
+# --- 4. CATÁLOGO DE SITIOS (CACHÉ EN DISCO) ---
+# El catálogo se sirve siempre desde disco; GitHub solo se consulta en segundo plano
+CATALOG_DIR = os.environ.get("WMN_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whatsmyname"))
+CATALOG_PATH = os.path.join(CATALOG_DIR, "wmn-data.json")
+CATALOG_META_PATH = os.path.join(CATALOG_DIR, "wmn-data.meta.json")
+# Instantánea que se distribuye con la aplicación, usada si aún no hay caché local.
+# Va versionada en git (Streamlit Cloud no tiene paso de build): no se edita a mano, la
+# regenera `python cli.py catalog --bundle` desde .github/workflows/catalog-snapshot.yml.
+BUNDLED_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "wmn-data.json")
+CATALOG_REFRESH_INTERVAL = int(os.environ.get("WMN_CATALOG_REFRESH", str(6 * 3600)))
+CATALOG_FETCH_TIMEOUT = 15
+# Campos de una entrada que deciden el resultado: si cambian, lo verificado antes caduca
+SITE_CHECK_FIELDS = ('uri_check', 'post_body', 'headers', 'e_code', 'e_string', 'm_code', 'm_string', 'max_bytes')
+
+def catalog_version(raw):
+    """Versión del catálogo: huella corta del contenido de wmn-data.json"""
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+def site_fingerprint(site):
+    """Huella corta de las reglas con que se verifica un sitio (URL, petición y criterios)"""
+    if 'fingerprint' in site: return site['fingerprint']
+    rules = json.dumps({f: site.get(f) for f in SITE_CHECK_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha256(rules.encode()).hexdigest()[:12]
+
+def write_file_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def read_catalog_meta():
+    try:
+        with open(CATALOG_META_PATH, encoding='utf-8') as f: return json.load(f)
+    except: return {}
+
+def load_catalog_from_disk():
+    """Carga la caché local o, en su defecto, la instantánea incluida"""
+    for path, source in ((CATALOG_PATH, "cache"), (BUNDLED_CATALOG_PATH, "bundled")):
+        try:
+            with open(path, 'rb') as f: raw = f.read()
+            sites = json.loads(raw)['sites']
+            if sites: return {"sites": sites, "version": catalog_version(raw), "source": source}
+        except: continue
+    return {"sites": [], "version": None, "source": "empty"}
+
+def refresh_catalog():
+    """Descarga condicional de wmn-data.json (ETag / If-Modified-Since).
+
+    Devuelve True si se guardó un catálogo nuevo en disco y False si no hubo cambios.
+    """
+    meta = read_catalog_meta()
+    headers = get_headers()
+    if os.path.exists(CATALOG_PATH):
+        if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
+    r = get_session().get(WMN_DATA_URL, headers=headers, timeout=CATALOG_FETCH_TIMEOUT)
+    meta['checked_at'] = time.time()
+    changed = False
+    if r.status_code != 304:
+        r.raise_for_status()
+        raw = r.content
+        if not json.loads(raw).get('sites'): raise ValueError("wmn-data.json sin sitios")
+        write_file_atomic(CATALOG_PATH, raw)
+        meta.update(etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified'), version=catalog_version(raw))
+        changed = True
+    write_file_atomic(CATALOG_META_PATH, json.dumps(meta).encode('utf-8'))
+    return changed
+
+def bundle_catalog(path=BUNDLED_CATALOG_PATH):
+    """Descarga wmn-data.json y lo guarda como instantánea incluida; devuelve (sitios, versión)"""
+    r = get_session().get(WMN_DATA_URL, headers=get_headers(), timeout=CATALOG_FETCH_TIMEOUT)
+    r.raise_for_status()
+    raw = r.content
+    sites = json.loads(raw).get('sites')
+    if not sites: raise ValueError("wmn-data.json sin sitios")
+    write_file_atomic(path, raw)
+    return len(sites), catalog_version(raw)
+
+class SiteIndex:
+    """Catálogo compilado una sola vez: buckets por categoría, host de cada sitio,
+    plantillas de URL ya partidas, extractor resuelto y entradas duplicadas eliminadas.
+
+    Lo usan por igual la interfaz y cualquier ejecución sin interfaz.
+    """
+    def __init__(self, raw_sites, version=None):
+        self.version = version
+        self.sites = []
+        self.by_category = {}
+        seen = set()
+        for raw in raw_sites:
+            # Dos entradas con la misma URL y las mismas reglas son la misma verificación
+            key = (raw.get('uri_check'), raw.get('e_code'), raw.get('e_string'), raw.get('m_code'), raw.get('m_string'))
+            if key in seen or not raw.get('uri_check'): continue
+            seen.add(key)
+            site = self.compile_site(raw)
+            self.sites.append(site)
+            self.by_category.setdefault(site['cat'], []).append(site)
+        self.categories = sorted(self.by_category)
+
+    @staticmethod
+    def compile_site(raw):
+        site = dict(raw)
+        template = raw['uri_check']
+        parts = template.split("{account}")
+        # Solo se precompila si no hay otras llaves que str.format tendría que procesar
+        if len(parts) > 1 and not any("{" in p or "}" in p for p in parts):
+            site['uri_parts'] = tuple(parts)
+        site['host'] = url_host(template.replace("{account}", "x"))
+        site['extractor'] = resolve_extractor(raw['name'])
+        site['fingerprint'] = site_fingerprint(raw)
+        return site
+
+    def filter(self, category=None):
+        if not category: return self.sites
+        return self.by_category.get(category, [])
+
+class SiteCatalog:
+    """Catálogo en memoria compartido por el proceso, con refresco en segundo plano"""
+    def __init__(self):
+        self.data = load_catalog_from_disk()
+        self.index = SiteIndex(self.data['sites'], self.data['version'])
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Con catálogo vacío se refresca ya; si no, se respeta el intervalo desde la última consulta
+        last_check = read_catalog_meta().get('checked_at', 0) if self.data['sites'] else 0
+        self._next_check = last_check + CATALOG_REFRESH_INTERVAL
+
+    @property
+    def sites(self): return self.data['sites']
+
+    @property
+    def version(self): return self.data['version']
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or time.time() < self._next_check: return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="wmn-catalog-refresh", daemon=True).start()
+
+    def refresh_now(self):
+        """Refresco síncrono, para ejecuciones sin interfaz que no tienen catálogo local"""
+        with self._lock:
+            self._refreshing = True
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            if refresh_catalog():
+                data = load_catalog_from_disk()
+                # Se compila antes de publicar para que nadie vea un índice a medias
+                self.index = SiteIndex(data['sites'], data['version'])
+                self.data = data
+            self._next_check = time.time() + CATALOG_REFRESH_INTERVAL
+        except Exception as e:
+            log.warning("Error catálogo: %s", e)
+            # Tras un fallo se reintenta antes que en el ciclo normal
+            self._next_check = time.time() + 300
+        finally:
+            self._refreshing = False
+
+@shared_resource
+def get_catalog():
+    return SiteCatalog()
+
+def load_site_index(wait=False):
+    """Índice del catálogo. Con wait=True (CLI/API) se descarga en el momento si no hay copia local"""
+    catalog = get_catalog()
+    if wait and not catalog.sites:
+        catalog.refresh_now()
+        if not catalog.sites: log.error("Catálogo vacío: sin caché local, sin instantánea incluida (python cli.py catalog --bundle) y sin acceso a GitHub")
+    else: catalog.refresh_in_background()
+    return catalog.index
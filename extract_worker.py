@@ -0,0 +1,23 @@
+"""Trabajador de extracción de ExtractPool (engine.py).
+
+Se lanza como script aparte (`python extract_worker.py`): no importa main.py ni
+el resto de la aplicación, solo socid-extractor. Lee por stdin una petición JSON
+por línea ({"html": ...}) y contesta por stdout otra línea con {"data": ...} o
+{"error": ...}, en el mismo orden.
+"""
+import json
+import sys
+
+def main():
+    from socid_extractor import extract
+    replies = sys.stdout
+    # Lo que socid-extractor imprima no debe mezclarse con las respuestas
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        try: reply = {"data": extract(json.loads(line)["html"])}
+        except Exception as e: reply = {"error": repr(e)}
+        replies.write(json.dumps(reply, ensure_ascii=False, default=str) + "\n")
+        replies.flush()
+
+if __name__ == "__main__":
+    main()
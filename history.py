@@ -0,0 +1,244 @@
+"""Historial persistente de escaneos para vigilar usuarios día a día.
+
+Guarda el último estado de cada (usuario, sitio, reglas del sitio) en SQLite.
+Un re-escaneo incremental solo vuelve a la red para lo caducado, lo inconcluso o
+lo que se verificó con otras reglas del sitio; el resto se sirve del historial.
+Cada resultado nuevo se compara con el último estado concluyente y los cambios
+(cuentas nuevas, desaparecidas, bio o avatar distintos) quedan registrados.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from engine import (
+    CATALOG_DIR, FOUND, INCONCLUSIVE, NOT_FOUND, load_site_index, normalize_username, not_found_record, run_checks,
+    schedule_sites, shared_resource, site_fingerprint,
+)
+
+log = logging.getLogger("whatsmyname")
+
+HISTORY_DB = os.environ.get("WMN_HISTORY_DB", os.path.join(CATALOG_DIR, "history.sqlite"))
+# Antigüedad a partir de la cual una verificación concluyente se vuelve a hacer
+HISTORY_MAX_AGE = int(os.environ.get("WMN_HISTORY_MAX_AGE", str(7 * 86400)))
+# Escrituras agrupadas: las filas se acumulan en memoria y cada tanda se escribe en una
+# transacción corta, al llenarse o al pasar el intervalo, para no retener el bloqueo de
+# escritura de SQLite frente a otros procesos que comparten el archivo
+HISTORY_COMMIT_EVERY = 500
+HISTORY_COMMIT_INTERVAL = 2
+
+# Tipos de cambio entre escaneos
+NEW_ACCOUNT = "new"
+GONE_ACCOUNT = "gone"
+PROFILE_CHANGED = "changed"
+
+def profile_fields(res):
+    """Campos comparables de un hallazgo: los detalles extraídos más el avatar"""
+    fields = {k: str(v) for k, v in (res.get('details') or {}).items()}
+    if res.get('image'): fields["Avatar"] = res['image']
+    return fields
+
+def diff_profiles(before, after):
+    """{campo: [antes, después]} de lo que cambió entre dos hallazgos del mismo perfil"""
+    old, new = profile_fields(before), profile_fields(after)
+    return {k: [old.get(k), new.get(k)] for k in sorted(old.keys() | new.keys()) if old.get(k) != new.get(k)}
+
+class ScanHistory:
+    """Último estado por (usuario normalizado, sitio, huella de sus reglas) y registro de cambios.
+
+    `status` es el resultado de la última verificación (también inconclusa) y
+    `known_status`/`record` el último estado concluyente, que es contra lo que
+    se comparan los escaneos siguientes. Si la base está bloqueada o no se puede
+    escribir, el historial degrada a no-op (aviso en el log) en vez de cortar el escaneo.
+    """
+    def __init__(self, db_path, timeout=10):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._observations, self._changes = [], []
+        self._last_flush = time.monotonic()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=timeout, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS observations (
+                username TEXT NOT NULL, site TEXT NOT NULL, site_version TEXT NOT NULL,
+                status TEXT NOT NULL, known_status TEXT, record TEXT, checked_at REAL NOT NULL,
+                PRIMARY KEY (username, site, site_version));
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, site TEXT NOT NULL,
+                kind TEXT NOT NULL, fields TEXT, uri TEXT, detected_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS changes_by_user ON changes (username, detected_at);
+        """)
+        # Historiales anteriores guardaban la versión del catálogo entero: esas filas
+        # conservan la línea base pero ya no coinciden con ninguna huella y se re-verifican
+        if any(col[1] == "catalog_version" for col in self._db.execute("PRAGMA table_info(observations)")):
+            self._db.execute("ALTER TABLE observations RENAME COLUMN catalog_version TO site_version")
+
+    def snapshot(self, username):
+        """{sitio: (huella, estado, estado concluyente, registro, verificado en)} con la
+        observación más reciente de cada sitio, sean cuales sean sus reglas"""
+        self.flush()
+        rows = self._query("SELECT site, site_version, status, known_status, record, checked_at FROM observations "
+                           "WHERE username = ? ORDER BY checked_at", (normalize_username(username),))
+        return {site: (version, status, known, json.loads(record) if record else None, checked_at)
+                for site, version, status, known, record, checked_at in rows}
+
+    def plan(self, username, target_sites, max_age=HISTORY_MAX_AGE, now=None):
+        """Reparte los sitios en (por verificar, vigentes) según el historial del usuario.
+
+        Vigente = verificado con las reglas actuales del sitio, con resultado concluyente y
+        hace menos de `max_age`; los vigentes se entregan como (sitio, resultado).
+        """
+        now = now or time.time()
+        snapshot = self.snapshot(username)
+        stale, fresh = [], []
+        for site in target_sites:
+            entry = snapshot.get(site['name'])
+            if (entry is None or entry[0] != site_fingerprint(site) or entry[1] == INCONCLUSIVE
+                    or now - entry[4] >= max_age):
+                stale.append(site)
+            else:
+                fresh.append((site, entry[3] if entry[1] == FOUND else None))
+        return stale, fresh
+
+    def record(self, site, username, res, previous=None):
+        """Guarda una verificación y devuelve el cambio detectado (o None).
+
+        `previous` es la entrada de snapshot() del sitio; sin historial previo del
+        sitio el resultado es la línea base y no cuenta como cambio. Un hallazgo
+        con `extract_failed` confirma que la cuenta existe, pero no se compara
+        ni sustituye al último registro bueno; y si el registro guardado es el
+        que falló, el siguiente bueno lo reemplaza sin contar como cambio.
+        """
+        status = res['status'] if res else NOT_FOUND
+        now = time.time()
+        known_status, record = (previous[2], previous[3]) if previous else (None, None)
+        uri = (res or record or {}).get('uri')
+        change = None
+        if status != INCONCLUSIVE:
+            failed = status == FOUND and res.get('extract_failed')
+            if known_status == NOT_FOUND and status == FOUND:
+                change = {"kind": NEW_ACCOUNT, "fields": {}}
+            elif known_status == FOUND and status == NOT_FOUND:
+                change = {"kind": GONE_ACCOUNT, "fields": {}}
+            elif known_status == FOUND and status == FOUND and not failed and record and not record.get('extract_failed'):
+                fields = diff_profiles(record, res)
+                if fields: change = {"kind": PROFILE_CHANGED, "fields": fields}
+            if status != FOUND: record = None
+            elif not (failed and record): record = {k: v for k, v in res.items() if k not in ('username', 'catalog_version')}
+            known_status = status
+        key = normalize_username(username)
+        with self._lock:
+            self._observations.append((key, site['name'], site_fingerprint(site), status, known_status,
+                                       json.dumps(record, ensure_ascii=False, default=str) if record else None, now))
+            if change:
+                self._changes.append((key, site['name'], change['kind'], json.dumps(change['fields'], ensure_ascii=False), uri, now))
+            if (len(self._observations) >= HISTORY_COMMIT_EVERY
+                    or time.monotonic() - self._last_flush >= HISTORY_COMMIT_INTERVAL):
+                self._flush()
+        if change: change.update(username=username, site=site['name'], uri=uri, detected_at=now)
+        return change
+
+    def changes(self, usernames=None, since=None, limit=1000):
+        """Cambios registrados, del más reciente al más antiguo"""
+        sql, args = "SELECT username, site, kind, fields, uri, detected_at FROM changes WHERE detected_at >= ?", [since or 0]
+        if usernames:
+            keys = [normalize_username(u) for u in usernames]
+            sql += f" AND username IN ({','.join('?' * len(keys))})"
+            args += keys
+        rows = self._query(sql + " ORDER BY detected_at DESC, id DESC LIMIT ?", args + [limit])
+        return [{"username": u, "site": s, "kind": k, "fields": json.loads(f or "{}"), "uri": uri, "detected_at": t}
+                for u, s, k, f, uri, t in rows]
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Escribe la tanda pendiente en una sola transacción corta; si falla, se descarta"""
+        self._last_flush = time.monotonic()
+        if not self._observations: return
+        observations, changes = self._observations, self._changes
+        self._observations, self._changes = [], []
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)", observations)
+                self._db.executemany("INSERT INTO changes (username, site, kind, fields, uri, detected_at) "
+                                     "VALUES (?, ?, ?, ?, ?, ?)", changes)
+                self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction: self._db.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            log.warning("Historial no disponible (%s): se descartan %d observaciones", e, len(observations))
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            try: return self._db.execute(sql, args).fetchall()
+            except sqlite3.OperationalError as e:
+                log.warning("Historial no disponible (%s): se continúa sin él", e)
+                return []
+
+@shared_resource
+def get_scan_history():
+    return ScanHistory(HISTORY_DB)
+
+def tracked_scan(usernames, target_sites, engine=None, catalog_version=None, refresh=False, metrics=None, control=None,
+                 priority=None, incremental=False, max_age=HISTORY_MAX_AGE, history=None):
+    """Escaneo (usuario × sitio) que alimenta el historial: entrega (sitio, usuario, resultado, cambio).
+
+    Con `incremental=True` los sitios vigentes en el historial se entregan sin tocar
+    la red (cuentan como aciertos de caché en `metrics`) y solo se verifica lo caducado,
+    lo inconcluso o lo comprobado con otras reglas del sitio.
+    """
+    history = history or get_scan_history()
+    snapshots = {}
+    stale = {}  # usuario -> nombres de sitio por verificar (None = todos)
+    try:
+        for username in usernames:
+            snapshots[username] = history.snapshot(username)
+            if not incremental:
+                stale[username] = None
+                continue
+            to_check, fresh = history.plan(username, target_sites, max_age)
+            stale[username] = {site['name'] for site in to_check}
+            for site, res in fresh:
+                if control is not None and control.stopped(): return
+                if metrics is not None: metrics.record_cache_hit()
+                if res is not None: res = dict(res, username=username, catalog_version=catalog_version)
+                if control is not None: control.observe(res)
+                yield site, username, res, None
+
+        # Un solo orden de envío para todos; cada usuario recorre solo sus sitios pendientes
+        ordered = schedule_sites(target_sites, priority)
+        jobs = ((site, username) for username in usernames for site in ordered
+                if stale[username] is None or site['name'] in stale[username])
+        checks = run_checks(jobs, engine, catalog_version, refresh=refresh, metrics=metrics, control=control)
+        try:
+            for site, username, res in checks:
+                change = history.record(site, username, res, snapshots[username].get(site['name']))
+                yield site, username, res, change
+        finally:
+            checks.close()
+    finally:
+        history.flush()
+
+def tracked_records(usernames, category=None, include_all=False, refresh=False, engine=None, metrics=None, control=None,
+                    priority=None, incremental=False, max_age=HISTORY_MAX_AGE):
+    """Escaneo sin interfaz (CLI/API): registros listos para NDJSON según terminan las verificaciones.
+
+    Por defecto solo entrega hallazgos; con include_all también los "no existe" y los
+    inconclusos. Cualquier registro con cambio frente al historial se entrega siempre,
+    con su campo `change`. No acumula nada, así que la memoria no crece con el escaneo.
+    """
+    index = load_site_index(wait=True)
+    for site, username, res, change in tracked_scan(usernames, index.filter(category), engine, index.version, refresh, metrics,
+                                                    control, priority, incremental, max_age):
+        if res is None:
+            if not include_all and change is None: continue
+            res = not_found_record(site, username, index.version)
+        elif not include_all and res['status'] != FOUND and change is None:
+            continue
+        yield dict(res, change=change) if change else res
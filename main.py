@@ -1,25 +1,37 @@
+import time
+RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import requests
-import pandas as pd
-from fpdf import FPDF
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import io
-from bs4 import BeautifulSoup
-import dns.resolver
-from email_validator import validate_email, EmailNotValidError
 import urllib.parse
-from datetime import datetime, timezone, timedelta
-import time
-import tempfile 
+import itertools
+import json
+import logging
 import os
 import re
+import shutil
+import tempfile
+import weakref
+from collections import deque
+from datetime import datetime, timezone
 import pytz # Necesario para zonas horarias precisas
 
-# Importamos socid-extractor
-try:
-    from socid_extractor import extract as socid_extract
-except ImportError:
-    socid_extract = None
+from engine import (
+    ScanControl, analyze_email, get_headers, get_session, analyze_emails, decode_linkedin_dates, decode_tiktok_dates,
+    extract_linkedin_date, extract_tiktok_date, is_hit, parse_lines,
+    load_site_index, not_found_record, parse_usernames, plan_variant_checks, rank_variants, scan_variants, username_variants,
+)
+from history import HISTORY_MAX_AGE, get_scan_history, tracked_scan
+from metrics import PhaseTimer, ScanMetrics
+from reports import (
+    EXPORT_FORMATS, EmailExport, StreamingExport, build_csv, build_pdf, build_txt, get_image_cache,
+    report_timestamps,
+)
+from results import MemoryBudget, ResultStore
+
+log = logging.getLogger("whatsmyname")
+# Cada ejecución (arranque o rerun) se cronometra por fases; con ?profile=1 o WMN_PROFILE=1 se muestra
+profiler = PhaseTimer(RUN_STARTED)
+profiler.mark("imports")
 
 # --- 1. CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -30,13 +42,19 @@ st.set_page_config(
 )
 
 # --- 2. GESTIÓN DE ESTADO ---
+# Resultados compactos con un presupuesto de memoria común a todas las listas de la sesión
+# (al pasarse se vuelca a disco lo más antiguo)
+if "memory_budget" not in st.session_state:
+    st.session_state.memory_budget = MemoryBudget()
 if "results" not in st.session_state:
-    st.session_state.results = []
+    st.session_state.results = ResultStore(st.session_state.memory_budget, label="Hallazgos")
+if "batch_results" not in st.session_state:
+    st.session_state.batch_results = ResultStore(st.session_state.memory_budget, label="Lote")
 if "search_active" not in st.session_state:
     st.session_state.search_active = False
 
 # --- 3. ESTILOS CSS ---
-st.markdown("""
+APP_CSS = """
 <style>
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
@@ -80,322 +98,166 @@ st.markdown("""
     }
     .footer-credits a {color: #1c3961; font-weight: bold; text-decoration: none;}
 </style>
-""", unsafe_allow_html=True)
-
-# --- 4. MOTORES DE EXTRACCIÓN (USUARIOS) ---
-def get_headers():
-    return {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
-
-def extract_telegram(username):
-    try:
-        r = requests.get(f"https://t.me/{username}", headers=get_headers(), timeout=5)
-        soup = BeautifulSoup(r.text, 'html.parser')
-        image = soup.find("meta", property="og:image")
-        title = soup.find("meta", property="og:title")
-        desc = soup.find("meta", property="og:description")
-        
-        details = {}
-        img_url = None
-        if title:
-            name_raw = title.get("content", "").replace("Telegram: Contact @", "")
-            details["Nombre Visible"] = name_raw.split(" - ")[0]
-        if desc: details["Biografía"] = desc.get("content", "")
-        if image: img_url = image.get("content")
-        return details, img_url
-    except:
-        return {}, None
-
-def extract_gitlab(username):
-    try:
-        r = requests.get(f"https://gitlab.com/api/v4/users?username={username}", headers=get_headers(), timeout=5)
-        if r.status_code == 200:
-            data_list = r.json()
-            if data_list and len(data_list) > 0:
-                user = data_list[0]
-                details = {
-                    "ID": user.get("id"),
-                    "Username": user.get("username"),
-                    "Nombre": user.get("name"),
-                    "Estado": user.get("state"),
-                    "Email Público": user.get("public_email", "Oculto"),
-                    "Web URL": user.get("web_url")
-                }
-                return {k: v for k, v in details.items() if v}, user.get("avatar_url")
-    except:
-        pass
-    return {}, None
-
-def extract_github(username):
-    try:
-        r = requests.get(f"https://api.github.com/users/{username}", headers=get_headers(), timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            details = {
-                "ID": data.get("id"),
-                "Node ID": data.get("node_id"),
-                "Tipo": data.get("type"),
-                "Nombre": data.get("name"),
-                "Empresa": data.get("company"),
-                "Blog": data.get("blog"),
-                "Ubicación": data.get("location"),
-                "Email": data.get("email"),
-                "Bio": data.get("bio"),
-                "Twitter": data.get("twitter_username"),
-                "Repos Públicos": data.get("public_repos"),
-                "Seguidores": data.get("followers"),
-                "Siguiendo": data.get("following"),
-                "Creado": data.get("created_at"),
-                "Actualizado": data.get("updated_at")
-            }
-            return {k: v for k, v in details.items() if v}, data.get("avatar_url")
-    except:
-        pass
-    return {}, None
-
-def extract_gravatar(username):
-    try:
-        r = requests.get(f"https://en.gravatar.com/{username}.json", headers=get_headers(), timeout=5)
-        if r.status_code == 200:
-            data = r.json()['entry'][0]
-            return {"Nombre": data.get("displayName"), "Ubicación": data.get("currentLocation")}, data.get("thumbnailUrl")
-    except:
-        pass
-    return {}, None
-
-def extract_generic_meta(url):
-    try:
-        r = requests.get(url, headers=get_headers(), timeout=5)
-        soup = BeautifulSoup(r.text, 'html.parser')
-        details = {}
-        image = None
-        if soup.title: details["Título"] = soup.title.string.strip()[:50]
-        img = soup.find("meta", property="og:image")
-        if img: image = img.get("content")
-        return details, image
-    except:
-        return {}, None
-
-def check_site(site, username):
-    uri = site['uri_check'].format(account=username)
-    try:
-        r = requests.get(uri, headers=get_headers(), timeout=6)
-        if r.status_code != site['e_code']: return None
-        if site.get('e_string') and site['e_string'] not in r.text: return None
-    except:
+"""
+
+# Datos estáticos de la interfaz: se calculan una vez por proceso y no en cada rerun
+LOGO_URL = "https://manuelbot59.com/images/logo/logo_horizontal_3_en.png"
+LOGO_RETRY_INTERVAL = 300
+DEFAULT_TIMEZONE = "America/Lima"
+
+@st.cache_resource(show_spinner=False)
+def get_css():
+    """CSS sin comentarios ni espacios sobrantes: es lo que se reenvía en cada rerun"""
+    css = re.sub(r"/\*.*?\*/", "", APP_CSS, flags=re.S)
+    return re.sub(r"\s*([{};:,])\s*", r"\1", re.sub(r"\s+", " ", css)).strip()
+
+@st.cache_resource(show_spinner=False)
+def get_timezones():
+    timezones = tuple(sorted(pytz.all_timezones))
+    return timezones, timezones.index(DEFAULT_TIMEZONE) if DEFAULT_TIMEZONE in timezones else 0
+
+@st.cache_resource(show_spinner=False, ttl=24 * 3600)
+def get_logo():
+    """Logo descargado una vez al día y servido desde memoria. Si falla lanza la excepción,
+    y st.cache_resource no la guarda: solo se cachea una descarga buena"""
+    r = get_session().get(LOGO_URL, headers=get_headers(), timeout=5)
+    r.raise_for_status()
+    return r.content
+
+@st.cache_resource(show_spinner=False)
+def get_logo_backoff():
+    return {"retry_at": 0.0}
+
+def load_logo():
+    """Bytes del logo o None; tras un fallo no se reintenta hasta LOGO_RETRY_INTERVAL, para
+    que los reruns no esperen el timeout mientras el servidor del logo no responde"""
+    backoff = get_logo_backoff()
+    if time.time() < backoff["retry_at"]: return None
+    try: return get_logo()
+    except Exception:
+        backoff["retry_at"] = time.time() + LOGO_RETRY_INTERVAL
         return None
 
-    details = {}
-    image_url = None
-    site_name = site['name'].lower()
-    
-    if "telegram" in site_name: details, image_url = extract_telegram(username)
-    elif "gitlab" in site_name: details, image_url = extract_gitlab(username)
-    elif "github" in site_name: details, image_url = extract_github(username)
-    elif "gravatar" in site_name: details, image_url = extract_gravatar(username)
-    else:
-        details, image_url = extract_generic_meta(uri)
-        if not details and socid_extract:
-            try:
-                data = socid_extract(uri)
-                if data:
-                    details = {k: v for k, v in data.items() if v and k != 'image'}
-                    image_url = data.get('image')
-            except: pass
-
-    if not image_url:
-        try:
-            domain = uri.split('/')[2]
-            image_url = f"https://www.google.com/s2/favicons?domain={domain}&sz=128"
-        except: image_url = "https://via.placeholder.com/128?text=Found"
-
-    return {"name": site['name'], "uri": uri, "category": site['cat'], "image": image_url, "details": details}
-
-# --- 5. MÓDULO DE CORREO ---
-def analyze_email(email):
-    results = {}
-    try:
-        v = validate_email(email)
-        email = v["email"]
-        results['valid_format'] = True
-    except EmailNotValidError as e: return {'valid_format': False, 'error': str(e)}
-
-    domain = email.split('@')[1]
-    username_part = email.split('@')[0]
-    results['domain'], results['username_part'] = domain, username_part
-
-    try:
-        mx = dns.resolver.resolve(domain, 'MX')
-        results['has_mail_server'] = True
-    except: results['has_mail_server'] = False
-
-    import hashlib
-    email_hash = hashlib.md5(email.lower().encode('utf-8')).hexdigest()
-    try:
-        r = requests.get(f"https://en.gravatar.com/{email_hash}.json", headers=get_headers(), timeout=5)
-        if r.status_code == 200:
-            data = r.json()['entry'][0]
-            results['gravatar'] = {'found': True, 'profile': data.get('profileUrl'), 'image': data.get('thumbnailUrl'), 'name': data.get('displayName'), 'location': data.get('currentLocation')}
-        else: results['gravatar'] = {'found': False}
-    except: results['gravatar'] = {'found': False}
-
-    try:
-        r = requests.get(f"https://www.duolingo.com/2017-06-30/users?email={email}", headers=get_headers(), timeout=5)
-        if r.status_code == 200 and r.json()['users']:
-            user = r.json()['users'][0]
-            results['duolingo'] = {"image": user.get("picture") + "/xxlarge" if user.get("picture") else None, "username": user.get("username"), "learning": [c['title'] for c in user.get("courses", [])]}
-    except: pass
-
-    return results
-
-# --- 6. MÓDULOS DE FECHA (MEJORADOS CON ZONA HORARIA) ---
-
-def extract_tiktok_date(url):
-    """Devuelve la fecha UTC y el timestamp puro"""
-    try:
-        match = re.search(r'/video/(\d+)', url)
-        if match:
-            vid_id = int(match.group(1))
-            binary = f"{vid_id:b}"
-            first_31_bits = binary[:31]
-            timestamp = int(first_31_bits, 2)
-            # Retorna fecha UTC pura
-            date_utc = datetime.fromtimestamp(timestamp, timezone.utc)
-            return date_utc
-    except:
-        pass
-    return None
-
-def extract_linkedin_date(url):
-    """Devuelve la fecha UTC y el timestamp puro"""
-    try:
-        match = re.search(r'([0-9]{19})', url)
-        if match:
-            post_id = int(match.group(1))
-            binary = f"{post_id:b}"
-            first_41_bits = binary[:41]
-            timestamp_ms = int(first_41_bits, 2)
-            # Retorna fecha UTC pura
-            date_utc = datetime.fromtimestamp(timestamp_ms / 1000.0, timezone.utc)
-            return date_utc
-    except:
-        pass
-    return None
-
-# --- 7. GENERADORES DE ARCHIVOS ---
-WMN_DATA_URL = "https://raw.githubusercontent.com/WebBreacher/WhatsMyName/main/wmn-data.json"
-APP_URL = "https://whatsmyname.streamlit.app/"
-
-def clean_text(text):
-    if not isinstance(text, str): return str(text)
-    return text.encode('latin-1', 'replace').decode('latin-1')
-
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, clean_text('Reporte SOCMINT - WhatsMyName Web'), 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-25)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 5, clean_text('Herramienta: WhatsMyName Web | Autor: Manuel Travezaño'), 0, 1, 'C')
-        self.set_text_color(0, 0, 255)
-        self.cell(0, 5, APP_URL, 0, 1, 'C', link=APP_URL)
-        self.set_text_color(0, 0, 0)
-        self.cell(0, 5, f'Pagina {self.page_no()}', 0, 0, 'C')
-
-def generate_files(results, target):
-    # Usamos la zona horaria del sistema o UTC por defecto
-    now = datetime.now(timezone.utc)
-    timestamp_display = now.strftime("%d/%m/%Y %H:%M:%S (UTC)")
-    timestamp_filename = now.strftime("%Y%m%d_%H%M%S")
-
-    df = pd.DataFrame(results)
-    df['fecha_extraccion'] = timestamp_display
-    csv = df.drop(columns=['details', 'image'], errors='ignore').to_csv(index=False).encode('utf-8')
-    
-    txt = io.StringIO()
-    txt.write(f"REPORTE DE INVESTIGACION - USUARIO: {target}\n")
-    txt.write(f"Fecha de Extraccion: {timestamp_display}\n")
-    txt.write(f"Herramienta: {APP_URL}\n")
-    txt.write("="*60 + "\n\n")
-    for item in results:
-        txt.write(f"Plataforma: {item['name']}\n")
-        txt.write(f"URL: {item['uri']}\n")
-        if item.get('details'):
-            for k, v in item['details'].items():
-                txt.write(f"  - {k}: {v}\n")
-        txt.write("-" * 20 + "\n")
-    
-    pdf_bytes = None
-    try:
-        pdf = PDFReport() 
-        pdf.add_page()
-        pdf.set_font("Arial", size=10)
-        
-        pdf.cell(0, 10, clean_text(f"Objetivo: {target}"), ln=1)
-        pdf.cell(0, 10, clean_text(f"Fecha: {timestamp_display}"), ln=1)
-        pdf.cell(0, 10, f"Total Hallazgos: {len(results)}", ln=1)
-        pdf.ln(10)
+@st.cache_resource(show_spinner=False)
+def get_run_counter():
+    return {"runs": 0}
+
+st.markdown(get_css(), unsafe_allow_html=True)
+profiler.mark("config_estado_css")
+# --- 4. REPORTES (MEMOIZADOS PARA LA UI) ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_text_reports(fingerprint, _results, target, scanned_at):
+    timestamp_display, timestamp_filename = report_timestamps(scanned_at)
+    results = _results.dicts()
+    return build_csv(results, timestamp_display), build_txt(results, target, timestamp_display), timestamp_filename
+
+@st.cache_data(max_entries=16, show_spinner="Generando PDF...")
+def get_pdf_report(fingerprint, _results, target, scanned_at):
+    timestamp_display, _ = report_timestamps(scanned_at)
+    return build_pdf(_results.dicts(), target, timestamp_display)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_variant_ranking(fingerprint, _results, variants):
+    # Una sola pasada por los hallazgos (también los volcados a disco) cada vez que cambian
+    return rank_variants(_results, variants)
+# --- 5. INTERFAZ ---
+# Intervalo mínimo (segundos) entre refrescos del progreso y de la rejilla de resultados
+UI_FLUSH_INTERVAL = 0.5
+# Filas del lote que se pintan en la tabla
+BATCH_TABLE_ROWS = 1000
+STOP_REASONS = {"cancelled": "detenido por el usuario", "deadline": "plazo agotado", "max_hits": "tope de hallazgos alcanzado"}
+EXPORT_BUTTONS = {"jsonl": ("JSONL", "application/x-ndjson"), "csv": ("CSV", "text/csv"),
+                  "parquet": ("Parquet", "application/vnd.apache.parquet")}
+CHANGE_LABELS = {"new": "🆕 Cuenta nueva", "gone": "❌ Cuenta desaparecida", "changed": "✏️ Perfil modificado"}
+
+def render_result_card(item, image=None):
+    """Tarjeta de un hallazgo; `image` son los bytes de la miniatura si ya están en caché
+    (si no, el navegador carga la URL original)"""
+    image = image or item.get('image')
+    with st.container(border=True):
+        cc1, cc2 = st.columns([1, 4])
+        with cc1: 
+            try: st.image(image, width=40)
+            except: st.write("📷")
+        with cc2:
+            st.markdown(f"<div class='site-title'>{item['name']}</div>", unsafe_allow_html=True)
+            st.markdown(f"<span class='site-cat'>{item['category']}</span>", unsafe_allow_html=True)
+            st.link_button("🔗 Visitar", item['uri'], width="stretch")
         
-        for item in results:
-            pdf.set_fill_color(240, 240, 240)
-            pdf.set_font("Arial", 'B', 11)
-            pdf.cell(0, 8, clean_text(f"{item['name']} ({item['category']})"), 1, 1, 'L', 1)
-            
-            start_y = pdf.get_y()
-            image_width = 0
-            
-            # Gestión de imagen
-            if item.get('image') and "placeholder" not in item['image']:
-                try:
-                    img_data = requests.get(item['image'], headers=get_headers(), timeout=3).content
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                        tmp_file.write(img_data)
-                        tmp_path = tmp_file.name
-                    pdf.image(tmp_path, x=pdf.get_x() + 2, y=start_y + 2, w=25)
-                    image_width = 30
-                    os.unlink(tmp_path)
-                except:
-                    image_width = 0
-            
-            pdf.set_left_margin(10 + image_width)
-            pdf.set_y(start_y + 2)
-            pdf.set_font("Arial", size=9)
-            pdf.set_text_color(0, 0, 255)
-            pdf.multi_cell(0, 5, clean_text(f"URL: {item['uri']}"))
-            pdf.set_text_color(0, 0, 0)
-            
-            if item.get('details'):
-                pdf.ln(2)
-                pdf.set_font("Arial", 'B', 9)
-                pdf.cell(0, 5, clean_text("Detalles Extraídos:"), ln=1)
-                pdf.set_font("Arial", size=8)
-                for k, v in item['details'].items():
-                    val = str(v).replace('\n', ' ').strip()
-                    pdf.multi_cell(0, 4, clean_text(f"- {k}: {val}"))
-            
-            pdf.set_left_margin(10)
-            pdf.set_y(start_y + 35 if image_width > 0 and pdf.get_y() < start_y + 30 else pdf.get_y() + 5)
-            pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-            pdf.ln(5)
-
-        pdf_bytes = pdf.output(dest='S').encode('latin-1', 'ignore')
-    except Exception as e:
-        print(f"Error PDF: {e}")
-        pdf_bytes = None
-        
-    return csv, txt.getvalue(), pdf_bytes, timestamp_filename
-
-# --- 8. INTERFAZ ---
-@st.cache_data
-def load_sites():
-    try: return requests.get(WMN_DATA_URL).json()['sites']
-    except: return []
+        if item.get('details'):
+            with st.expander("👁️ Ver Detalles Extraídos"):
+                dc1, dc2 = st.columns([1, 2])
+                with dc1:
+                    try: st.image(image, width="stretch", caption="Perfil")
+                    except: st.caption("Imagen no disponible")
+                with dc2:
+                    for k, v in item['details'].items():
+                        st.markdown(f"**{k}:** {v}")
+
+def flush_result_cards(grid_cols, new_items, start_index):
+    """Añade solo las tarjetas nuevas a la rejilla (sin volver a pintar las anteriores).
+    Usa las miniaturas que la caché compartida ya tenga, sin esperar a las que siguen
+    descargándose: el bucle que consume el escaneo nunca se bloquea en la UI."""
+    images = get_image_cache().fetch_many((item.get('image') for item in new_items), timeout=0)
+    for i, item in enumerate(new_items, start=start_index):
+        with grid_cols[i % 2]:
+            render_result_card(item, images.get(item.get('image')))
+
+def render_file_downloads(key, paths, file_stem):
+    """Descarga de exportaciones escritas en disco. El archivo solo se abre en el rerun que
+    sigue a "Preparar descarga"; el resto de reruns no lo leen ni lo copian a memoria"""
+    paths = {fmt: path for fmt, path in paths.items() if os.path.exists(path)}
+    if not paths: return
+    c1, c2 = st.columns(2)
+    with c1:
+        fmt = st.selectbox("Formato", list(paths), format_func=lambda f: EXPORT_BUTTONS[f][0], key=f"{key}_fmt",
+                           label_visibility="collapsed")
+    with c2:
+        if st.button("📦 Preparar descarga", key=f"{key}_prepare", width="stretch"):
+            label, mime = EXPORT_BUTTONS[fmt]
+            with open(paths[fmt], 'rb') as f:
+                st.download_button(f"⬇️ Descargar {label}", f, f"{file_stem}.{fmt}", mime, width="stretch", key=f"{key}_download")
+
+def render_changes(changes):
+    """Tabla de cambios frente al historial (cuentas nuevas, desaparecidas y perfiles modificados)"""
+    rows = [{"Usuario": c['username'], "Sitio": c['site'], "Cambio": CHANGE_LABELS.get(c['kind'], c['kind']),
+             "Campos": "; ".join(f"{k}: {old or '—'} → {new or '—'}" for k, (old, new) in c['fields'].items()),
+             "URL": c['uri']} for c in changes]
+    st.dataframe(rows, hide_index=True, width="stretch")
+
+def render_recent_changes(store):
+    """Los cambios más recientes de un ResultStore de cambios (el resto sigue en el store y en el historial)"""
+    recent = store.recent(BATCH_TABLE_ROWS)
+    render_changes(recent)
+    if len(store) > len(recent):
+        st.caption(f"Mostrando los últimos {len(recent)} de {len(store)} cambios.")
+
+def recent_targets(per_target):
+    """Filas de los últimos usuarios iniciados del lote, sin recorrer los demás"""
+    return list(itertools.islice(reversed(per_target.values()), BATCH_TABLE_ROWS))[::-1]
+
+def render_bulk_dates(key, decoder, timezone_name):
+    """Modo masivo de las pestañas de fechas: miles de URLs o IDs decodificados de una vez"""
+    with st.expander("📋 Modo masivo (varias URLs o IDs)"):
+        k1, k2 = st.columns(2)
+        with k1: text = st.text_area("URLs o IDs (uno por línea)", key=f"{key}_bulk_in", height=150)
+        with k2: upload = st.file_uploader("...o sube un archivo TXT/CSV", type=["txt", "csv"], key=f"{key}_bulk_file")
+        # Línea a línea: las URLs pueden llevar comas y el @usuario de TikTok no se toca
+        values = parse_lines(text + "\n" + (upload.getvalue().decode('utf-8', 'replace') if upload else ""))
+        if st.button(f"DECODIFICAR ({len(values)})", type="primary", key=f"{key}_bulk_run", disabled=not values):
+            st.session_state[f"{key}_timeline"] = decoder(values, timezone_name)
+        timeline = st.session_state.get(f"{key}_timeline")
+        if timeline is not None:
+            dated = int(timeline["fecha_utc"].notna().sum())
+            st.caption(f"{dated} de {len(timeline)} entradas con fecha · ordenadas de la más antigua a la más reciente")
+            st.dataframe(timeline, hide_index=True, width="stretch")
+            st.download_button("📄 Descargar línea de tiempo (CSV)", timeline.to_csv(index=False).encode('utf-8'),
+                               f"{key}_linea_de_tiempo.csv", "text/csv", key=f"{key}_bulk_csv")
 
 with st.sidebar:
-    try: st.image("https://manuelbot59.com/images/logo/logo_horizontal_3_en.png", use_column_width=True)
-    except: st.header("ManuelBot59")
+    logo = load_logo()
+    if logo: st.image(logo, width="stretch")
+    else: st.header("ManuelBot59")
     st.markdown("### 📌 Navegación")
     st.markdown("""
     - [🏠 Inicio](https://manuelbot59.com/)
@@ -405,20 +267,33 @@ with st.sidebar:
     
     # --- CONFIGURACIÓN DE ZONA HORARIA COMPLETA ---
     st.markdown("### 🕒 Configuración Horaria")
-    # Obtener todas las zonas horarias disponibles
-    all_timezones = sorted(pytz.all_timezones)
-    # Intentar poner America/Lima como defecto
-    try:
-        default_ix = all_timezones.index("America/Lima")
-    except ValueError:
-        default_ix = 0
+    # Todas las zonas horarias disponibles, con America/Lima por defecto
+    all_timezones, default_ix = get_timezones()
     selected_timezone = st.selectbox("Tu Zona Horaria:", all_timezones, index=default_ix)
     st.markdown("---")
     
+    with st.expander("🧠 Memoria de la sesión"):
+        # Texto y no tabla: el panel se pinta en cada rerun y st.dataframe arrastraría pandas
+        for key, value in list(st.session_state.items()):
+            if isinstance(value, ResultStore):
+                r = value.report()
+                st.markdown(f"**{r['lista']}**: {r['resultados']} resultados · {r['en_memoria']} en memoria ({r['memoria_kb']} KB) · "
+                            f"{r['en_disco']} en disco ({r['disco_kb']} KB)")
+            elif isinstance(value, (StreamingExport, EmailExport)):
+                disk = sum(os.path.getsize(p) for p in value.paths.values() if os.path.exists(p))
+                st.markdown(f"**Exportación `{key}`**: en disco ({disk / 1024:.1f} KB)")
+            elif hasattr(value, "memory_usage"):
+                st.markdown(f"**Tabla `{key}`**: {value.memory_usage(deep=True).sum() / 1024:.1f} KB en memoria")
+        budget = st.session_state.memory_budget
+        st.caption(f"Listas de resultados: {budget.used() / 1024 / 1024:.1f} de {budget.limit / 1024 / 1024:.0f} MB por sesión, "
+                   "compartidos entre todas; al pasarse se vuelcan a disco los resultados más antiguos. "
+                   "Las tablas de fechas no cuentan para ese límite.")
+
     st.markdown("### 📞 Soporte")
     st.markdown("📧 **Email:** ManuelBot@proton.me")
     st.markdown("✈️ **Telegram Soporte:** [ManuelBot59](https://t.me/ManuelBot59_Bot)")
 
+profiler.mark("sidebar")
 st.markdown("<h1 class='main-title'>ManuelBot59 Suite OSINT</h1>", unsafe_allow_html=True)
 
 # SISTEMA DE PESTAÑAS (NOMBRES CORREGIDOS)
@@ -428,80 +303,285 @@ tab1, tab2, tab3, tab4 = st.tabs(["👤 Usuario", "📧 Correo", "🎵 Extractor
 with tab1:
     st.markdown("### 🔎 Rastreador de Huella Digital")
     progress_placeholder = st.empty()
-    sites = load_sites()
-    categories = sorted(list(set([s['cat'] for s in sites])))
+    site_index = load_site_index()
+    if not site_index.sites:
+        st.info("⏳ Descargando el catálogo de sitios de WhatsMyName, recarga en unos segundos.")
+    categories = site_index.categories
     
     c1, c2, c3 = st.columns([3, 1, 1])
     with c1: username = st.text_input("Usuario", placeholder="Ej: manuelbot59", key="u_in")
     with c2: cat_filter = st.selectbox("Categoría", ["Todas"] + categories, key="c_in")
     with c3: run_user = st.button("INVESTIGAR", type="primary", key="b_u")
+    force_refresh = st.checkbox("Ignorar resultados en caché (volver a verificar todo)", key="no_cache")
+    with st.expander("⚙️ Opciones de escaneo"):
+        o1, o2, o3 = st.columns(3)
+        with o1: scan_deadline = st.number_input("Plazo máximo (segundos, 0 = sin límite)", 0, 3600, 0, key="scan_deadline")
+        with o2: scan_max_hits = st.number_input("Parar tras N hallazgos (0 = todos)", 0, 10000, 0, key="scan_max_hits")
+        with o3: scan_priority = st.multiselect("Categorías prioritarias", categories, key="scan_priority")
+        h1, h2 = st.columns(2)
+        with h1: scan_incremental = st.checkbox("Re-escaneo incremental (solo lo caducado o inconcluso del historial)", key="scan_incremental")
+        with h2: scan_max_age = st.number_input("Considerar caducado tras (días)", 0.0, 365.0, HISTORY_MAX_AGE / 86400, key="scan_max_age",
+                                                disabled=not scan_incremental)
+
+    # Un escaneo que no llegó a su fin lo cortó el botón Detener (o cualquier otra interacción)
+    for flag_key, stop_key in (("scan_running", "scan_stopped"), ("batch_running", "batch_stopped"), ("variants_running", "variants_stopped")):
+        if st.session_state.get(flag_key):
+            st.session_state[flag_key] = False
+            st.session_state[stop_key] = STOP_REASONS["cancelled"]
 
     user_res_container = st.container()
 
     if run_user and username:
-        st.session_state.results = []
-        target_sites = sites if cat_filter == "Todas" else [s for s in sites if s['cat'] == cat_filter]
+        st.session_state.results = ResultStore(st.session_state.memory_budget, label="Hallazgos")
+        st.session_state.inconclusive = ResultStore(st.session_state.memory_budget, label="Inconclusos")
+        st.session_state.scan_target = username
+        st.session_state.scan_time = datetime.now(timezone.utc)
+        st.session_state.scan_stopped = None
+        st.session_state.scan_metrics = None
+        st.session_state.scan_changes = ResultStore(st.session_state.memory_budget, label="Cambios")
+        st.session_state.scan_running = True
+        scan_metrics = ScanMetrics()
+        control = ScanControl(scan_deadline, scan_max_hits)
+        target_sites = site_index.filter(None if cat_filter == "Todas" else cat_filter)
         
         with progress_placeholder.container():
             prog_bar = st.progress(0)
             status_text = st.empty()
+            # Pulsarlo provoca un rerun: el generador se abandona y cancela lo pendiente
+            st.button("⏹️ Detener escaneo", key="b_stop")
         
         processed = 0
+        total = len(target_sites)
         with user_res_container:
-            grid_dynamic = st.empty()
+            grid_cols = st.columns(2)
         
-        with ThreadPoolExecutor(max_workers=15) as executor:
-            futures = {executor.submit(check_site, s, username): s for s in target_sites}
-            for future in as_completed(futures):
-                res = future.result()
-                processed += 1
-                if processed % 5 == 0 or processed == len(target_sites):
-                    prog_bar.progress(processed / len(target_sites))
-                    status_text.caption(f"Verificando: {processed}/{len(target_sites)}")
-                
-                if res:
-                    st.session_state.results.append(res)
-                    with grid_dynamic.container():
-                        cols = st.columns(2)
-                        for i, item in enumerate(st.session_state.results):
-                            with cols[i % 2]:
-                                with st.container(border=True):
-                                    cc1, cc2 = st.columns([1, 4])
-                                    with cc1: 
-                                        try: st.image(item['image'], width=40)
-                                        except: st.write("📷")
-                                    with cc2:
-                                        st.markdown(f"<div class='site-title'>{item['name']}</div>", unsafe_allow_html=True)
-                                        st.markdown(f"<span class='site-cat'>{item['category']}</span>", unsafe_allow_html=True)
-                                        st.link_button("🔗 Visitar", item['uri'], use_container_width=True)
-                                    
-                                    if item.get('details'):
-                                        with st.expander("👁️ Ver Detalles Extraídos"):
-                                            dc1, dc2 = st.columns([1, 2])
-                                            with dc1:
-                                                try: st.image(item['image'], use_column_width=True, caption="Perfil")
-                                                except: st.caption("Imagen no disponible")
-                                            with dc2:
-                                                for k, v in item['details'].items():
-                                                    st.markdown(f"**{k}:** {v}")
+        # Las tarjetas nuevas se acumulan y se pintan por lotes: la UI nunca frena al motor
+        pending = []
+        last_flush = time.monotonic()
+        for _, _, res, change in tracked_scan([username], target_sites, catalog_version=site_index.version, refresh=force_refresh,
+                                              metrics=scan_metrics, control=control, priority=scan_priority,
+                                              incremental=scan_incremental, max_age=scan_max_age * 86400):
+            processed += 1
+            if change: st.session_state.scan_changes.append(change)
+            if is_hit(res):
+                pending.append(st.session_state.results.append(res))
+                get_image_cache().prefetch([res.get('image')])
+            elif res:
+                st.session_state.inconclusive.append(res)
+            
+            if time.monotonic() - last_flush >= UI_FLUSH_INTERVAL or processed == total:
+                prog_bar.progress(processed / total)
+                status_text.caption(f"Verificando: {processed}/{total} · Sin respuesta concluyente: {len(st.session_state.inconclusive)}")
+                flush_result_cards(grid_cols, pending, len(st.session_state.results) - len(pending))
+                pending = []
+                last_flush = time.monotonic()
         
+        flush_result_cards(grid_cols, pending, len(st.session_state.results) - len(pending))
         prog_bar.progress(100)
+        st.session_state.scan_running = False
+        st.session_state.scan_metrics = scan_metrics.summary()
+        if control.reason:
+            st.session_state.scan_stopped = f"{STOP_REASONS[control.reason]} ({processed}/{total} sitios verificados)"
+    
+    if st.session_state.get("scan_stopped"):
+        st.warning(f"⏹️ Escaneo parcial: {st.session_state.scan_stopped}")
+    
+    if st.session_state.get("scan_changes"):
+        with st.expander(f"🔄 {len(st.session_state.scan_changes)} cambios desde el último escaneo", expanded=True):
+            render_recent_changes(st.session_state.scan_changes)
+
+    if st.session_state.get("scan_target"):
+        with st.expander(f"📜 Historial de cambios de {st.session_state.scan_target}"):
+            past_changes = get_scan_history().changes([st.session_state.scan_target], limit=200)
+            if past_changes: render_changes(past_changes)
+            else: st.caption("Sin cambios registrados todavía: el primer escaneo sirve de línea base.")
+
+    if st.session_state.get("inconclusive"):
+        with st.expander(f"⚠️ {len(st.session_state.inconclusive)} sitios sin respuesta concluyente (limitados o caídos)"):
+            for item in st.session_state.inconclusive:
+                st.markdown(f"- [{item['name']}]({item['uri']}) · {item.get('reason') or 'sin motivo'}")
+    
+    if st.session_state.get("scan_metrics"):
+        summary = st.session_state.scan_metrics
+        with st.expander("⏱️ Métricas del escaneo"):
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Verificaciones", summary["checks"])
+            m2.metric("Desde caché", summary["cache_hits"])
+            m3.metric("Duración", f"{summary['wall_seconds']:.1f} s")
+            m4.metric("Descargado", f"{summary['bytes_read'] / 1024:.0f} KB")
+            st.dataframe([dict(fase=phase, **stats) for phase, stats in summary["phases"].items()], hide_index=True, width="stretch")
+            if summary["errors"]: st.caption("Errores: " + ", ".join(f"{k}: {v}" for k, v in summary["errors"].items()))
+            st.download_button("📊 Descargar métricas (JSON)", json.dumps(summary, ensure_ascii=False, indent=2),
+                               f"metricas_{st.session_state.get('scan_target', 'escaneo')}.json", "application/json")
     
     if st.session_state.results:
         st.divider()
         st.subheader("📥 Exportar Reporte")
-        csv, txt, pdf, ts_filename = generate_files(st.session_state.results, username)
+        # Los reportes se memoizan por huella: los reruns de la página no los reconstruyen
+        report_target = st.session_state.get("scan_target", username)
+        scanned_at = st.session_state.get("scan_time")
+        fingerprint = st.session_state.results.fingerprint()
+        csv, txt, ts_filename = get_text_reports(fingerprint, st.session_state.results, report_target, scanned_at)
         
         d1, d2, d3 = st.columns(3)
         with d1: 
-            st.download_button("📄 Descargar CSV", csv, f"{username}_{ts_filename}.csv", "text/csv", use_container_width=True)
+            st.download_button("📄 Descargar CSV", csv, f"{report_target}_{ts_filename}.csv", "text/csv", width="stretch")
         with d2: 
-            st.download_button("📝 Descargar TXT", txt, f"{username}_{ts_filename}.txt", "text/plain", use_container_width=True)
+            st.download_button("📝 Descargar TXT", txt, f"{report_target}_{ts_filename}.txt", "text/plain", width="stretch")
         with d3:
-            if pdf: 
-                st.download_button("📕 Descargar PDF", pdf, f"{username}_{ts_filename}.pdf", "application/pdf", use_container_width=True)
-            else: 
-                st.warning("PDF no disponible")
+            # El PDF (con descarga de avatares) solo se genera cuando se pide
+            if st.session_state.get("pdf_for") == fingerprint or st.button("📕 Preparar PDF", width="stretch"):
+                st.session_state.pdf_for = fingerprint
+                pdf = get_pdf_report(fingerprint, st.session_state.results, report_target, scanned_at)
+                if pdf: 
+                    st.download_button("📕 Descargar PDF", pdf, f"{report_target}_{ts_filename}.pdf", "application/pdf", width="stretch")
+                else: 
+                    st.warning("PDF no disponible")
+
+    # --- ESCANEO POR LOTES ---
+    st.divider()
+    with st.expander("📋 Escaneo por Lotes (varios usuarios)"):
+        b1, b2 = st.columns(2)
+        with b1: batch_text = st.text_area("Usuarios (uno por línea o separados por comas)", key="batch_in", height=150)
+        with b2: batch_file = st.file_uploader("...o sube un archivo TXT/CSV", type=["txt", "csv"], key="batch_file")
+        batch_source = batch_text + "\n" + (batch_file.getvalue().decode('utf-8', 'replace') if batch_file else "")
+        batch_users = parse_usernames(batch_source)
+        run_batch = st.button(f"INVESTIGAR LOTE ({len(batch_users)} usuarios)", type="primary", key="b_batch", disabled=not batch_users)
+        st.caption("Se usa el filtro de categoría de arriba. Todos los usuarios comparten el mismo pool de conexiones.")
+
+        if run_batch and batch_users:
+            batch_sites = site_index.filter(None if cat_filter == "Todas" else cat_filter)
+            st.session_state.batch_results = ResultStore(st.session_state.memory_budget, label="Lote")
+            st.session_state.batch_time = datetime.now(timezone.utc)
+            total = len(batch_sites) * len(batch_users)
+            # Contadores por usuario, creados al llegar su primer resultado; la tabla solo pinta los últimos
+            per_target = {}
+            # Exportación a disco según llegan los resultados: sobrevive a Detener y a un rerun.
+            # El directorio se borra con el lote siguiente o cuando la sesión suelta sus resultados
+            if st.session_state.get("batch_export_dir"): shutil.rmtree(st.session_state.batch_export_dir, ignore_errors=True)
+            st.session_state.batch_export_dir = tempfile.mkdtemp(prefix="wmn-lote-")
+            weakref.finalize(st.session_state.batch_results, shutil.rmtree, st.session_state.batch_export_dir, ignore_errors=True)
+            batch_export = StreamingExport(os.path.join(st.session_state.batch_export_dir, "lote"), EXPORT_FORMATS,
+                                           st.session_state.batch_time)
+            st.session_state.batch_export = batch_export
+
+            st.session_state.batch_stopped = None
+            st.session_state.batch_changes = ResultStore(st.session_state.memory_budget, label="Cambios del lote")
+            st.session_state.batch_running = True
+            batch_control = ScanControl(scan_deadline)
+
+            batch_prog = st.progress(0)
+            batch_status = st.empty()
+            st.button("⏹️ Detener lote", key="b_stop_batch")
+            target_table = st.empty()
+            processed = 0
+            last_flush = time.monotonic()
+            try:
+                for site, user, res, change in tracked_scan(batch_users, batch_sites, catalog_version=site_index.version, refresh=force_refresh,
+                                                            control=batch_control, priority=scan_priority,
+                                                            incremental=scan_incremental, max_age=scan_max_age * 86400):
+                    processed += 1
+                    if change:
+                        st.session_state.batch_changes.append(change)
+                        batch_export.add(dict(res or not_found_record(site, user, site_index.version), change=change))
+                    elif is_hit(res):
+                        batch_export.add(res)
+                    counts = per_target.get(user)
+                    if counts is None:
+                        counts = per_target[user] = {"Usuario": user, "Verificados": 0, "Total": len(batch_sites), "Hallazgos": 0, "Inconclusos": 0}
+                    counts["Verificados"] += 1
+                    if is_hit(res):
+                        counts["Hallazgos"] += 1
+                        st.session_state.batch_results.append(res)
+                    elif res:
+                        counts["Inconclusos"] += 1
+                    
+                    if time.monotonic() - last_flush >= UI_FLUSH_INTERVAL or processed == total:
+                        batch_prog.progress(processed / total)
+                        batch_status.caption(f"Verificando: {processed}/{total} · Usuarios iniciados: {len(per_target)}/{len(batch_users)} "
+                                             f"· Hallazgos: {len(st.session_state.batch_results)}")
+                        target_table.dataframe(recent_targets(per_target), hide_index=True, width="stretch")
+                        last_flush = time.monotonic()
+            finally:
+                batch_export.close()
+            batch_prog.progress(100)
+            target_table.dataframe(recent_targets(per_target), hide_index=True, width="stretch")
+            st.session_state.batch_running = False
+            if batch_control.reason:
+                st.session_state.batch_stopped = f"{STOP_REASONS[batch_control.reason]} ({processed}/{total} verificaciones)"
+
+        if st.session_state.get("batch_stopped"):
+            st.warning(f"⏹️ Lote parcial: {st.session_state.batch_stopped}")
+
+        if st.session_state.get("batch_changes"):
+            st.markdown(f"**🔄 {len(st.session_state.batch_changes)} cambios desde el último escaneo**")
+            render_recent_changes(st.session_state.batch_changes)
+
+        if st.session_state.batch_results:
+            batch_results = st.session_state.batch_results
+            # Solo se pintan los últimos: el lote completo está en las descargas
+            recent = batch_results.recent(BATCH_TABLE_ROWS)
+            st.dataframe([{k: r.get(k) for k in ('username', 'name', 'category', 'uri')} for r in recent],
+                         hide_index=True, width="stretch")
+            if len(batch_results) > len(recent):
+                st.caption(f"Mostrando los últimos {len(recent)} de {len(batch_results)} hallazgos.")
+
+        if st.session_state.get("batch_export"):
+            _, b_ts = report_timestamps(st.session_state.get("batch_time"))
+            render_file_downloads("b_export", st.session_state.batch_export.paths, f"lote_{b_ts}")
+
+    # --- VARIANTES DE USUARIO ---
+    with st.expander("🧬 Variantes del usuario (puntos, guiones, dígitos, leetspeak)"):
+        seed = st.text_input("Usuario semilla", value=username, key="variant_seed")
+        generated = username_variants(seed) if seed else []
+        chosen = st.multiselect("Variantes a verificar", generated, default=generated, key=f"variants_{seed}")
+        variant_sites = site_index.filter(None if cat_filter == "Todas" else cat_filter)
+        variant_plan = plan_variant_checks(chosen, variant_sites)
+        planned_checks = sum(len(v) for v in variant_plan.values())
+        st.caption(f"{planned_checks} verificaciones de {len(chosen) * len(variant_sites)} posibles "
+                   "(se omiten las variantes que no caben en el subdominio de cada sitio).")
+        run_variants = st.button(f"INVESTIGAR VARIANTES ({len(chosen)})", type="primary", key="b_variants", disabled=not chosen)
+
+        if run_variants and chosen:
+            st.session_state.variant_results = ResultStore(st.session_state.memory_budget, label="Variantes")
+            st.session_state.variant_names = chosen
+            st.session_state.variants_stopped = None
+            st.session_state.variants_running = True
+            variant_control = ScanControl(scan_deadline)
+            variant_prog = st.progress(0)
+            variant_status = st.empty()
+            st.button("⏹️ Detener variantes", key="b_stop_variants")
+            processed = 0
+            last_flush = time.monotonic()
+            for _, _, res in scan_variants(chosen, variant_sites, catalog_version=site_index.version, refresh=force_refresh,
+                                           control=variant_control, priority=scan_priority):
+                processed += 1
+                if is_hit(res): st.session_state.variant_results.append(res)
+                if time.monotonic() - last_flush >= UI_FLUSH_INTERVAL or processed == planned_checks:
+                    variant_prog.progress(min(processed / max(planned_checks, 1), 1.0))
+                    variant_status.caption(f"Verificando: {processed}/{planned_checks} · Hallazgos: {len(st.session_state.variant_results)}")
+                    last_flush = time.monotonic()
+            variant_prog.progress(100)
+            st.session_state.variants_running = False
+            if variant_control.reason:
+                st.session_state.variants_stopped = f"{STOP_REASONS[variant_control.reason]} ({processed}/{planned_checks} verificaciones)"
+
+        if st.session_state.get("variants_stopped"):
+            st.warning(f"⏹️ Variantes parciales: {st.session_state.variants_stopped}")
+
+        if st.session_state.get("variant_results"):
+            variant_hits = st.session_state.variant_results
+            ranking = get_variant_ranking(variant_hits.fingerprint(), variant_hits, st.session_state.variant_names)
+            st.markdown("**🏆 Ranking de variantes** (los sitios que aceptan cualquier variante pesan menos)")
+            st.dataframe([{"Variante": r['username'], "Puntuación": r['score'], "Hallazgos": r['hits'],
+                          "Sitios": ", ".join(r['sites'])} for r in ranking], hide_index=True, width="stretch")
+            recent = variant_hits.recent(BATCH_TABLE_ROWS)
+            st.dataframe([{k: r.get(k) for k in ('username', 'name', 'category', 'uri')} for r in recent],
+                         hide_index=True, width="stretch")
+            if len(variant_hits) > len(recent):
+                st.caption(f"Mostrando los últimos {len(recent)} de {len(variant_hits)} hallazgos.")
+
+profiler.mark("tab_usuario")
 
 # --- TAB 2: CORREOS ---
 with tab2:
@@ -550,7 +630,55 @@ with tab2:
             
             lc = st.columns(4)
             for i, (name, url) in enumerate(links):
-                with lc[i % 4]: st.link_button(f"🔎 {name}", url, use_container_width=True)
+                with lc[i % 4]: st.link_button(f"🔎 {name}", url, width="stretch")
+
+    # --- ANÁLISIS MASIVO DE CORREOS ---
+    st.divider()
+    with st.expander("📋 Análisis masivo (varios correos)"):
+        m1, m2 = st.columns(2)
+        with m1: emails_text = st.text_area("Correos (uno por línea o separados por comas)", key="emails_in", height=150)
+        with m2: emails_file = st.file_uploader("...o sube un archivo TXT/CSV", type=["txt", "csv"], key="emails_file")
+        email_list = parse_usernames(emails_text + "\n" + (emails_file.getvalue().decode('utf-8', 'replace') if emails_file else ""))
+        run_emails = st.button(f"ANALIZAR CORREOS ({len(email_list)})", type="primary", key="b_emails", disabled=not email_list)
+
+        if run_emails and email_list:
+            # CSV y JSONL se escriben a disco según llega cada dirección: al terminar ya están listos.
+            # El directorio se borra con el análisis siguiente o cuando la sesión suelta la exportación
+            if st.session_state.get("email_export_dir"): shutil.rmtree(st.session_state.email_export_dir, ignore_errors=True)
+            st.session_state.email_export_dir = tempfile.mkdtemp(prefix="wmn-correos-")
+            export = EmailExport(os.path.join(st.session_state.email_export_dir, "correos"))
+            weakref.finalize(export, shutil.rmtree, st.session_state.email_export_dir, ignore_errors=True)
+            st.session_state.email_export = export
+            st.session_state.email_time = datetime.now(timezone.utc)
+            # Solo se pintan las últimas filas y unos totales: la lista completa está en las descargas
+            rows = deque(maxlen=BATCH_TABLE_ROWS)
+            totals = {"valid_format": 0, "has_mail_server": 0, "gravatar": 0, "duolingo_username": 0}
+            processed = 0
+            email_prog = st.progress(0)
+            email_status = st.empty()
+            email_table = st.empty()
+            last_flush = time.monotonic()
+            try:
+                for res in analyze_emails(email_list):
+                    row = export.add(res)
+                    rows.append(row)
+                    processed += 1
+                    for field in totals: totals[field] += bool(row.get(field))
+                    if time.monotonic() - last_flush >= UI_FLUSH_INTERVAL or processed == len(email_list):
+                        email_prog.progress(processed / len(email_list))
+                        email_status.caption(f"Analizados: {processed}/{len(email_list)} · Formato válido: {totals['valid_format']} · "
+                                             f"Con MX: {totals['has_mail_server']} · Gravatar: {totals['gravatar']} · Duolingo: {totals['duolingo_username']}")
+                        email_table.dataframe(list(rows), hide_index=True, width="stretch")
+                        last_flush = time.monotonic()
+            finally:
+                export.close()
+            email_prog.progress(100)
+
+        if st.session_state.get("email_export"):
+            _, e_ts = report_timestamps(st.session_state.get("email_time"))
+            render_file_downloads("e_export", st.session_state.email_export.paths, f"correos_{e_ts}")
+
+profiler.mark("tab_correo")
 
 # --- TAB 3: TIKTOK DATE (CON ZONA HORARIA) ---
 with tab3:
@@ -578,6 +706,10 @@ with tab3:
         else:
             st.warning("⚠️ Ingresa una URL válida.")
 
+    render_bulk_dates("tiktok", decode_tiktok_dates, selected_timezone)
+
+profiler.mark("tab_tiktok")
+
 # --- TAB 4: LINKEDIN DATE (CON ZONA HORARIA) ---
 with tab4:
     st.markdown("### 💼 Extractor de Fecha de LinkedIn")
@@ -604,6 +736,10 @@ with tab4:
         else:
             st.warning("⚠️ Ingresa una URL válida.")
 
+    render_bulk_dates("linkedin", decode_linkedin_dates, selected_timezone)
+
+profiler.mark("tab_linkedin")
+
 # Footer Actualizado (CON ENLACE A GITHUB)
 st.markdown("""
 <div class="footer-credits">
@@ -615,5 +751,16 @@ st.markdown("""
 </div>
 
 """, unsafe_allow_html=True)
-
-
+profiler.mark("footer")
+
+# --- 6. PERFIL DE ARRANQUE / RERUN ---
+run_counter = get_run_counter()
+run_counter["runs"] += 1
+if os.environ.get("WMN_PROFILE") == "1" or st.query_params.get("profile") == "1":
+    run_kind = "arranque en frío" if run_counter["runs"] == 1 else f"rerun #{run_counter['runs']} del proceso"
+    profile = profiler.report()
+    log.info("Perfil (%s): %s", run_kind, ", ".join(f"{p['fase']}={p['ms']}ms" for p in profile))
+    with st.sidebar.expander("⏱️ Perfil de esta ejecución", expanded=True):
+        st.caption(run_kind)
+        for p in profile:
+            st.markdown(f"`{p['fase']}` · {p['ms']} ms ({p['%']} %)")
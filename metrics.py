@@ -0,0 +1,176 @@
+"""Métricas del motor: tiempos por fase, resultados y bytes transferidos por sitio.
+
+Cada verificación lleva un CheckTrace. Al terminar se agrega en el registro
+global del proceso (expuesto en formato Prometheus por /metrics de la API) y,
+si el escaneo lo pide, en un ScanMetrics con su propio resumen JSON.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+# Fases de una verificación. "wait" = esperas del limitador por host y backoffs;
+# "connect" incluye TCP + TLS (ni requests ni aiohttp los separan).
+PHASES = ("wait", "dns", "connect", "first_byte", "body", "extraction")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class CheckTrace:
+    """Tiempos, bytes y errores de una verificación, sumando todas sus tentativas"""
+    __slots__ = ("site", "phases", "bytes", "attempts", "errors", "outcome", "reason", "started", "total")
+
+    def __init__(self, site):
+        self.site = site
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.bytes = 0
+        self.attempts = 0
+        self.errors = []
+        self.outcome = None
+        self.reason = None
+        self.started = time.perf_counter()
+        self.total = 0.0
+
+    def add(self, phase, seconds):
+        self.phases[phase] += max(0.0, seconds)
+
+    def error(self, category):
+        self.errors.append(category)
+
+    def finish(self, outcome, reason=None):
+        self.outcome = outcome
+        self.reason = reason
+        self.total = time.perf_counter() - self.started
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Cuantil aproximado: límite superior del bucket donde cae. Si cae en el bucket
+        abierto (+Inf) se devuelve el último límite, una cota inferior que sigue siendo JSON válido"""
+        if not self.count: return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target: return bound
+        return self.buckets[-1]
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsRegistry:
+    """Agregado de verificaciones: histogramas por fase, resultados, errores y estadísticas por sitio"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {phase: Histogram() for phase in PHASES + ("total",)}
+        self.outcomes = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.bytes_total = 0
+        self.sites = {}
+
+    def record(self, trace):
+        with self._lock:
+            for phase, seconds in trace.phases.items():
+                if seconds > 0: self.phases[phase].observe(seconds)
+            self.phases["total"].observe(trace.total)
+            self.outcomes[trace.outcome] += 1
+            for category in trace.errors:
+                self.errors[category] += 1
+            self.bytes_total += trace.bytes
+            stats = self.sites.get(trace.site)
+            if stats is None:
+                stats = self.sites[trace.site] = {"checks": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "outcomes": defaultdict(int)}
+            stats["checks"] += 1
+            stats["seconds"] += trace.total
+            stats["max_seconds"] = max(stats["max_seconds"], trace.total)
+            stats["bytes"] += trace.bytes
+            stats["outcomes"][trace.outcome] += 1
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            lines += ["# HELP wmn_check_phase_seconds Duración de cada fase de las verificaciones",
+                      "# TYPE wmn_check_phase_seconds histogram"]
+            for phase, hist in self.phases.items():
+                cumulative = 0
+                for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += n
+                    lines.append(f'wmn_check_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'wmn_check_phase_seconds_sum{{phase="{phase}"}} {hist.sum:.6f}')
+                lines.append(f'wmn_check_phase_seconds_count{{phase="{phase}"}} {hist.count}')
+
+            lines += ["# HELP wmn_checks_total Verificaciones terminadas por resultado", "# TYPE wmn_checks_total counter"]
+            lines += [f'wmn_checks_total{{outcome="{_label(k)}"}} {v}' for k, v in sorted(self.outcomes.items())]
+            lines += ["# HELP wmn_check_errors_total Tentativas fallidas por categoría", "# TYPE wmn_check_errors_total counter"]
+            lines += [f'wmn_check_errors_total{{category="{_label(k)}"}} {v}' for k, v in sorted(self.errors.items())]
+            lines += ["# HELP wmn_bytes_read_total Bytes de cuerpo leídos", "# TYPE wmn_bytes_read_total counter",
+                      f"wmn_bytes_read_total {self.bytes_total}"]
+
+            lines += ["# HELP wmn_site_checks_total Verificaciones por sitio y resultado", "# TYPE wmn_site_checks_total counter"]
+            for site, stats in sorted(self.sites.items()):
+                for outcome, n in sorted(stats["outcomes"].items()):
+                    lines.append(f'wmn_site_checks_total{{site="{_label(site)}",outcome="{_label(outcome)}"}} {n}')
+            lines += ["# HELP wmn_site_check_seconds Tiempo total de verificación por sitio", "# TYPE wmn_site_check_seconds summary"]
+            for site, stats in sorted(self.sites.items()):
+                lines.append(f'wmn_site_check_seconds_sum{{site="{_label(site)}"}} {stats["seconds"]:.6f}')
+                lines.append(f'wmn_site_check_seconds_count{{site="{_label(site)}"}} {stats["checks"]}')
+            lines += ["# HELP wmn_site_bytes_total Bytes leídos por sitio", "# TYPE wmn_site_bytes_total counter"]
+            lines += [f'wmn_site_bytes_total{{site="{_label(site)}"}} {stats["bytes"]}' for site, stats in sorted(self.sites.items())]
+        return "\n".join(lines) + "\n"
+
+class ScanMetrics(MetricsRegistry):
+    """Métricas de un único escaneo, con resumen JSON"""
+    def __init__(self):
+        super().__init__()
+        self.started_at = time.time()
+        self.cache_hits = 0
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def summary(self, top=20):
+        with self._lock:
+            slowest = sorted(self.sites.items(), key=lambda kv: kv[1]["max_seconds"], reverse=True)[:top]
+            return {
+                "started_at": self.started_at,
+                "wall_seconds": round(time.time() - self.started_at, 3),
+                "checks": self.phases["total"].count,
+                "cache_hits": self.cache_hits,
+                "outcomes": dict(self.outcomes),
+                "errors": dict(self.errors),
+                "bytes_read": self.bytes_total,
+                "phases": {phase: {"count": h.count, "mean_ms": round(h.sum / h.count * 1000, 1) if h.count else 0.0,
+                                   "p50_ms": h.quantile(0.5) * 1000, "p95_ms": h.quantile(0.95) * 1000}
+                           for phase, h in self.phases.items()},
+                "slowest_sites": [{"site": site, "max_seconds": round(s["max_seconds"], 3), "checks": s["checks"],
+                                   "bytes": s["bytes"], "outcomes": dict(s["outcomes"])} for site, s in slowest],
+            }
+
+class PhaseTimer:
+    """Cronómetro por fases de una ejecución (arranque o rerun de la interfaz)"""
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        total = self._last - self.started
+        return [{"fase": phase, "ms": round(seconds * 1000, 1), "%": round(100 * seconds / total, 1) if total else 0.0}
+                for phase, seconds in self.phases + [("total", total)]]
+
+# Registro global del proceso (lo expone /metrics)
+METRICS = MetricsRegistry()
@@ -0,0 +1,419 @@
+"""Generadores de reportes (CSV, TXT, JSONL y PDF) a partir de los resultados del motor"""
+import io
+import csv
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+import re
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from engine import CATALOG_DIR, FAVICON_URL, get_session, get_headers, shared_resource, write_file_atomic
+
+# pandas, fpdf, pyarrow y Pillow se importan dentro de las funciones que los usan:
+# la interfaz arranca (y cada rerun) sin pagarlos hasta que se genera un reporte
+
+log = logging.getLogger("whatsmyname")
+
+APP_URL = "https://whatsmyname.streamlit.app/"
+
+def clean_text(text):
+    if not isinstance(text, str): return str(text)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+@shared_resource
+def get_pdf_class():
+    """Clase del reporte PDF; fpdf se importa la primera vez que se genera uno"""
+    import fpdf
+
+    class PDFReport(fpdf.FPDF):
+        # fpdf2 acepta imágenes desde memoria; el pyfpdf 1.7 clásico solo desde archivo
+        accepts_streams = int(fpdf.FPDF_VERSION.split('.')[0]) >= 2
+
+        def header(self):
+            self.set_font('Arial', 'B', 15)
+            self.cell(0, 10, clean_text('Reporte SOCMINT - WhatsMyName Web'), 0, 1, 'C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-25)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 5, clean_text('Herramienta: WhatsMyName Web | Autor: Manuel Travezaño'), 0, 1, 'C')
+            self.set_text_color(0, 0, 255)
+            self.cell(0, 5, APP_URL, 0, 1, 'C', link=APP_URL)
+            self.set_text_color(0, 0, 0)
+            self.cell(0, 5, f'Pagina {self.page_no()}', 0, 0, 'C')
+    return PDFReport
+
+# Caché de imágenes compartida por todas las sesiones: miniaturas direccionadas por contenido
+IMAGE_CACHE_BYTES = int(os.environ.get("WMN_IMAGE_CACHE_BYTES", str(32 * 1024 * 1024)))
+IMAGE_URL_ENTRIES = 50000
+IMAGE_FETCH_WORKERS = 8
+IMAGE_FETCH_TIMEOUT = 3
+# Lado máximo (px) de las miniaturas que se sirven a la rejilla y al PDF
+THUMBNAIL_SIZE = 128
+# Los favicons de respaldo (uno por dominio) se guardan también en disco
+FAVICON_DIR = os.path.join(CATALOG_DIR, "favicons")
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    """Reduce la imagen una sola vez a PNG/JPEG de `size` px; b"" si no es una imagen válida.
+    Sin Pillow (lo instala fpdf2) se devuelven los bytes originales."""
+    try: from PIL import Image
+    except ImportError: return data
+    if not data: return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if max(img.size) <= size and img.format in ("PNG", "JPEG"): return data
+            img.thumbnail((size, size))
+            has_alpha = img.mode in ("RGBA", "LA", "P")
+            img = img.convert("RGBA" if has_alpha else "RGB")
+            out = io.BytesIO()
+            img.save(out, "PNG" if has_alpha else "JPEG", quality=85, optimize=True)
+            return out.getvalue()
+    except Exception:
+        return b""
+
+def favicon_path(url):
+    """Archivo en disco del favicon de respaldo de un dominio (None si la URL no es un favicon)"""
+    if not url.startswith(FAVICON_URL.split("{")[0]): return None
+    domain = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get("domain", [""])[0]
+    domain = re.sub(r"[^a-z0-9.-]", "_", domain.lower())
+    return os.path.join(FAVICON_DIR, f"{domain}.img") if domain else None
+
+class ImageCache:
+    """Caché de miniaturas direccionada por contenido y acotada por bytes.
+
+    Cada URL se descarga una sola vez (también si varias sesiones la piden a la
+    vez) y se reduce a miniatura en ese momento; URL -> huella SHA-1 y huella ->
+    bytes, así las URLs con la misma imagen (favicons, avatares por defecto)
+    ocupan una sola entrada. La rejilla de Streamlit y el PDF usan los mismos bytes.
+    """
+    FAILED = ""
+
+    def __init__(self, max_bytes, favicon_dir=None):
+        self.max_bytes = max_bytes
+        self.favicon_dir = favicon_dir
+        self._urls = OrderedDict()   # url -> huella ("" = fallo recordado)
+        self._blobs = OrderedDict()  # huella -> miniatura
+        self._size = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(IMAGE_FETCH_WORKERS, thread_name_prefix="wmn-images")
+
+    def get(self, url):
+        with self._lock:
+            digest = self._urls.get(url)
+            if digest is None: return None
+            self._urls.move_to_end(url)
+            if digest == self.FAILED: return b""
+            data = self._blobs.get(digest)
+            if data is None:
+                # La miniatura se expulsó: la URL vuelve a descargarse
+                del self._urls[url]
+                return None
+            self._blobs.move_to_end(digest)
+            return data
+
+    def put(self, url, data):
+        digest = hashlib.sha1(data).hexdigest() if data else self.FAILED
+        with self._lock:
+            self._urls[url] = digest
+            self._urls.move_to_end(url)
+            while len(self._urls) > IMAGE_URL_ENTRIES:
+                self._urls.popitem(last=False)
+            if not data or digest in self._blobs or len(data) > self.max_bytes: return
+            self._blobs[digest] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _load(self, url):
+        path = favicon_path(url) if self.favicon_dir else None
+        if path:
+            try:
+                with open(path, 'rb') as f: return f.read()
+            except OSError: pass
+        try:
+            r = get_session().get(url, headers=get_headers(), timeout=IMAGE_FETCH_TIMEOUT)
+            data = make_thumbnail(r.content) if r.status_code == 200 else b""
+        except Exception:
+            data = b""
+        if path and data:
+            try: write_file_atomic(path, data)
+            except OSError as e: log.debug("No se pudo guardar el favicon %s: %s", path, e)
+        return data
+
+    def _fetch(self, url):
+        try:
+            data = self._load(url)
+            # Los fallos también se recuerdan (b"") para no reintentarlos en cada reporte
+            self.put(url, data)
+            return data
+        finally:
+            with self._lock: self._inflight.pop(url, None)
+
+    def prefetch(self, urls):
+        """Lanza en segundo plano la descarga de las URLs que falten; devuelve {url: future}"""
+        futures = {}
+        for url in dict.fromkeys(u for u in urls if u):
+            if self.get(url) is not None: continue
+            with self._lock:
+                future = self._inflight.get(url)
+                if future is None: future = self._inflight[url] = self._executor.submit(self._fetch, url)
+            futures[url] = future
+        return futures
+
+    def fetch(self, url):
+        data = self.get(url)
+        if data is None: data = self.prefetch([url])[url].result()
+        return data or None
+
+    def fetch_many(self, urls, timeout=None):
+        """Miniaturas de varias URLs, descargando en paralelo solo las que no estén en caché"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        futures = self.prefetch(urls)
+        wait(futures.values(), timeout)
+        return {url: (self.get(url) if url not in futures or futures[url].done() else None) or None for url in urls}
+
+@shared_resource
+def get_image_cache():
+    return ImageCache(IMAGE_CACHE_BYTES, FAVICON_DIR)
+
+def image_suffix(data):
+    if data.startswith(b"\x89PNG"): return ".png"
+    if data.startswith(b"GIF8"): return ".gif"
+    return ".jpg"
+
+def pdf_image(pdf, data, x, y, w):
+    if pdf.accepts_streams:
+        pdf.image(io.BytesIO(data), x=x, y=y, w=w)
+        return
+    with tempfile.NamedTemporaryFile(delete=False, suffix=image_suffix(data)) as tmp_file:
+        tmp_file.write(data)
+        tmp_path = tmp_file.name
+    try: pdf.image(tmp_path, x=x, y=y, w=w)
+    finally: os.unlink(tmp_path)
+
+def report_timestamps(scanned_at=None):
+    now = scanned_at or datetime.now(timezone.utc)
+    return now.strftime("%d/%m/%Y %H:%M:%S (UTC)"), now.strftime("%Y%m%d_%H%M%S")
+
+def build_csv(results, timestamp_display):
+    import pandas as pd
+    df = pd.DataFrame(results)
+    df['fecha_extraccion'] = timestamp_display
+    return df.drop(columns=['details', 'image'], errors='ignore').to_csv(index=False).encode('utf-8')
+
+def build_txt(results, target, timestamp_display):
+    txt = io.StringIO()
+    txt.write(f"REPORTE DE INVESTIGACION - USUARIO: {target}\n")
+    txt.write(f"Fecha de Extraccion: {timestamp_display}\n")
+    txt.write(f"Herramienta: {APP_URL}\n")
+    versions = sorted({item['catalog_version'] for item in results if item.get('catalog_version')})
+    if versions: txt.write(f"Catalogo WhatsMyName: {', '.join(versions)}\n")
+    txt.write("="*60 + "\n\n")
+    for item in results:
+        txt.write(f"Plataforma: {item['name']}\n")
+        txt.write(f"URL: {item['uri']}\n")
+        if item.get('details'):
+            for k, v in item['details'].items():
+                txt.write(f"  - {k}: {v}\n")
+        txt.write("-" * 20 + "\n")
+    return txt.getvalue()
+
+def build_pdf(results, target, timestamp_display, image_cache=None):
+    try:
+        # Mismas miniaturas que la rejilla: solo se descargan (en paralelo) las que falten
+        image_cache = image_cache or get_image_cache()
+        images = image_cache.fetch_many(item.get('image') for item in results
+                                        if item.get('image') and "placeholder" not in item['image'])
+
+        pdf = get_pdf_class()()
+        pdf.add_page()
+        pdf.set_font("Arial", size=10)
+        
+        pdf.cell(0, 10, clean_text(f"Objetivo: {target}"), ln=1)
+        pdf.cell(0, 10, clean_text(f"Fecha: {timestamp_display}"), ln=1)
+        pdf.cell(0, 10, f"Total Hallazgos: {len(results)}", ln=1)
+        pdf.ln(10)
+        
+        for item in results:
+            pdf.set_fill_color(240, 240, 240)
+            pdf.set_font("Arial", 'B', 11)
+            pdf.cell(0, 8, clean_text(f"{item['name']} ({item['category']})"), 1, 1, 'L', 1)
+            
+            start_y = pdf.get_y()
+            image_width = 0
+            
+            # Gestión de imagen
+            img_data = images.get(item.get('image'))
+            if img_data:
+                try:
+                    pdf_image(pdf, img_data, x=pdf.get_x() + 2, y=start_y + 2, w=25)
+                    image_width = 30
+                except:
+                    image_width = 0
+            
+            pdf.set_left_margin(10 + image_width)
+            pdf.set_y(start_y + 2)
+            pdf.set_font("Arial", size=9)
+            pdf.set_text_color(0, 0, 255)
+            pdf.multi_cell(0, 5, clean_text(f"URL: {item['uri']}"))
+            pdf.set_text_color(0, 0, 0)
+            
+            if item.get('details'):
+                pdf.ln(2)
+                pdf.set_font("Arial", 'B', 9)
+                pdf.cell(0, 5, clean_text("Detalles Extraídos:"), ln=1)
+                pdf.set_font("Arial", size=8)
+                for k, v in item['details'].items():
+                    val = str(v).replace('\n', ' ').strip()
+                    pdf.multi_cell(0, 4, clean_text(f"- {k}: {val}"))
+            
+            pdf.set_left_margin(10)
+            pdf.set_y(start_y + 35 if image_width > 0 and pdf.get_y() < start_y + 30 else pdf.get_y() + 5)
+            pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+            pdf.ln(5)
+
+        out = pdf.output(dest='S')
+        # pyfpdf 1.7 devuelve str latin-1; fpdf2 devuelve bytearray
+        return out.encode('latin-1', 'ignore') if isinstance(out, str) else bytes(out)
+    except Exception as e:
+        log.warning("Error PDF: %s", e)
+        return None
+
+# Columnas del CSV de correos: una fila por dirección
+EMAIL_CSV_FIELDS = ["email", "valid_format", "domain", "has_mail_server", "gravatar", "gravatar_name",
+                    "gravatar_profile", "duolingo_username", "error"]
+
+def email_row(res):
+    """Aplana un resultado de analyze_emails para el CSV"""
+    gravatar = res.get('gravatar') or {}
+    duolingo = res.get('duolingo') or {}
+    return {"email": res.get('email'), "valid_format": res.get('valid_format'), "domain": res.get('domain'),
+            "has_mail_server": res.get('has_mail_server'), "gravatar": gravatar.get('found', False),
+            "gravatar_name": gravatar.get('name'), "gravatar_profile": gravatar.get('profile'),
+            "duolingo_username": duolingo.get('username'), "error": res.get('error')}
+
+class EmailExport:
+    """CSV y JSONL de correos escritos en disco según llega cada resultado, como StreamingExport"""
+    def __init__(self, path_prefix):
+        os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+        self.paths = {"csv": f"{path_prefix}.csv", "jsonl": f"{path_prefix}.jsonl"}
+        self.count = 0
+        self._csv_file = open(self.paths["csv"], "w", encoding="utf-8", newline="")
+        self._jsonl = open(self.paths["jsonl"], "w", encoding="utf-8")
+        self._writer = csv.DictWriter(self._csv_file, EMAIL_CSV_FIELDS)
+        self._writer.writeheader()
+        self._csv_file.flush()
+
+    def add(self, res):
+        """Escribe un resultado y devuelve su fila plana (la que va al CSV)"""
+        row = email_row(res)
+        self._writer.writerow(row)
+        self._csv_file.flush()
+        self._jsonl.write(json.dumps(res, ensure_ascii=False, default=str) + "\n")
+        self._jsonl.flush()
+        self.count += 1
+        return row
+
+    def close(self):
+        for f in (self._csv_file, self._jsonl):
+            if not f.closed: f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Exportación en streaming de escaneos: columnas fijas (CSV/Parquet) y filas por grupo de Parquet
+EXPORT_FIELDS = ["username", "name", "category", "status", "uri", "reason", "change", "catalog_version", "image", "fecha_extraccion"]
+PARQUET_ROW_GROUP = 5000
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+
+def export_row(res, timestamp_display):
+    """Fila plana de un resultado: `change` queda en su tipo y `details` como pares texto/texto"""
+    row = {k: res.get(k) for k in EXPORT_FIELDS}
+    change = res.get('change')
+    row['change'] = change.get('kind') if isinstance(change, dict) else change
+    row['fecha_extraccion'] = timestamp_display
+    return {k: None if v is None else str(v) for k, v in row.items()}
+
+class StreamingExport:
+    """JSONL, CSV y Parquet (opcional, con pyarrow) escritos según llega cada resultado.
+
+    JSONL y CSV van directos a disco con flush por línea: la memoria no crece con
+    el escaneo y un corte o una cancelación dejan escrito todo lo ya verificado.
+    Parquet acumula como mucho PARQUET_ROW_GROUP filas y necesita close() para
+    escribir su pie; `details` se guarda como columna map<texto, texto>.
+    """
+    def __init__(self, path_prefix, formats=("jsonl", "csv"), scanned_at=None):
+        formats = [f for f in EXPORT_FORMATS if f in formats]
+        self._pa = self._pq = None
+        if "parquet" in formats:
+            try:
+                import pyarrow, pyarrow.parquet
+                self._pa, self._pq = pyarrow, pyarrow.parquet
+            except ImportError:
+                log.warning("pyarrow no está instalado: se omite la exportación Parquet")
+                formats.remove("parquet")
+        os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+        self.paths = {fmt: f"{path_prefix}.{fmt}" for fmt in formats}
+        self.count = 0
+        self._timestamp = report_timestamps(scanned_at)[0]
+        self._jsonl = open(self.paths["jsonl"], "w", encoding="utf-8") if "jsonl" in self.paths else None
+        self._csv_file = self._csv = None
+        if "csv" in self.paths:
+            self._csv_file = open(self.paths["csv"], "w", encoding="utf-8", newline="")
+            self._csv = csv.DictWriter(self._csv_file, EXPORT_FIELDS)
+            self._csv.writeheader()
+            self._csv_file.flush()
+        self._rows = [] if "parquet" in self.paths else None
+        self._parquet = None
+
+    def add(self, res):
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(res, ensure_ascii=False, default=str) + "\n")
+            self._jsonl.flush()
+        row = export_row(res, self._timestamp)
+        if self._csv is not None:
+            self._csv.writerow(row)
+            self._csv_file.flush()
+        if self._rows is not None:
+            row['details'] = [(str(k), str(v)) for k, v in (res.get('details') or {}).items()]
+            self._rows.append(row)
+            if len(self._rows) >= PARQUET_ROW_GROUP: self._write_row_group()
+        self.count += 1
+
+    def _write_row_group(self):
+        if self._parquet is None:
+            pa = self._pa
+            schema = pa.schema([(k, pa.string()) for k in EXPORT_FIELDS] + [("details", pa.map_(pa.string(), pa.string()))])
+            self._parquet = self._pq.ParquetWriter(self.paths["parquet"], schema)
+        if self._rows:
+            self._parquet.write_table(self._pa.Table.from_pylist(self._rows, self._parquet.schema))
+            self._rows = []
+
+    def close(self):
+        if self._rows is not None:
+            # También sin resultados, para que el Parquet quede vacío pero válido
+            self._write_row_group()
+            self._rows = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        for f in (self._jsonl, self._csv_file):
+            if f is not None and not f.closed: f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
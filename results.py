@@ -0,0 +1,190 @@
+"""Resultados compactos para las sesiones de la interfaz, con presupuesto de memoria.
+
+Cada hallazgo se guarda como ResultRecord (con __slots__, textos repetidos
+internados y `details` serializado hasta que alguien lo lee) en vez de un dict
+con otro dict anidado. Todas las listas (ResultStore) de una sesión comparten
+un MemoryBudget: al pasarse, se vuelcan los registros más antiguos de la sesión,
+estén en la lista que estén, a un JSONL temporal por lista; al recorrer una lista
+se leen primero los volcados y luego los de memoria, en el orden en que llegaron.
+"""
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import weakref
+from collections import deque
+
+# Presupuesto de memoria de cada sesión, compartido por todas sus listas (hallazgos, inconclusos, lote...)
+SESSION_MEMORY_BUDGET = int(os.environ.get("WMN_SESSION_MEMORY", str(8 * 1024 * 1024)))
+# Al volcar se deja la memoria en esta fracción del presupuesto, para no volcar en cada append
+SPILL_TARGET_RATIO = 0.5
+
+RECORD_FIELDS = ("username", "name", "category", "status", "uri", "image", "reason", "catalog_version", "change")
+# Campos de texto que se repiten en miles de resultados
+INTERNED_FIELDS = ("username", "name", "category", "status", "catalog_version")
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class ResultRecord:
+    """Resultado del motor en formato compacto; se lee igual que el dict (item['name'], item.get('details'))"""
+    __slots__ = RECORD_FIELDS + ("_details", "_extra")
+
+    def __init__(self, res):
+        for field in RECORD_FIELDS:
+            value = res.get(field)
+            setattr(self, field, _intern(value) if field in INTERNED_FIELDS else value)
+        details = res.get('details')
+        self._details = json.dumps(details, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8") if details else None
+        extra = {k: v for k, v in res.items() if k not in RECORD_FIELDS and k != 'details'}
+        self._extra = extra or None
+
+    @property
+    def details(self):
+        """Se decodifica en cada acceso: en memoria solo viven los bytes"""
+        return json.loads(self._details) if self._details else {}
+
+    def get(self, key, default=None):
+        if key == 'details': return self.details if self._details else default
+        if key in RECORD_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return (self._extra or {}).get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError: raise KeyError(key)
+        return value
+
+    def to_dict(self):
+        res = {field: getattr(self, field) for field in RECORD_FIELDS if getattr(self, field) is not None}
+        if self._details: res['details'] = self.details
+        if self._extra: res.update(self._extra)
+        return res
+
+    def nbytes(self):
+        """Tamaño aproximado en memoria (los textos internados no se cuentan: son compartidos)"""
+        size = sys.getsizeof(self)
+        for field in RECORD_FIELDS:
+            if field not in INTERNED_FIELDS: size += sys.getsizeof(getattr(self, field))
+        if self._details: size += sys.getsizeof(self._details)
+        if self._extra: size += sys.getsizeof(json.dumps(self._extra, default=str))
+        return size
+
+def _remove(path):
+    try: os.unlink(path)
+    except OSError: pass
+
+class MemoryBudget:
+    """Presupuesto de memoria compartido por los ResultStore de una sesión.
+
+    Lo ocupado es la suma de las listas vivas (una lista que la sesión suelta deja
+    de contar). Al pasarse, se vuelca primero lo que llegó antes a la sesión hasta
+    dejar la memoria en SPILL_TARGET_RATIO del límite.
+    """
+    def __init__(self, limit=SESSION_MEMORY_BUDGET):
+        self.limit = limit
+        self.lock = threading.RLock()
+        self._stores = weakref.WeakSet()
+        self._counter = itertools.count()
+
+    def register(self, store):
+        with self.lock: self._stores.add(store)
+
+    def arrival(self):
+        """Número de llegada a la sesión: ordena los registros de todas las listas"""
+        return next(self._counter)
+
+    def used(self):
+        with self.lock: return sum(store._memory for store in self._stores)
+
+    def rebalance(self):
+        target = self.limit * SPILL_TARGET_RATIO
+        with self.lock:
+            while self.used() > target:
+                stores = sorted((s for s in self._stores if s._items), key=lambda s: s._arrivals[0])
+                if not stores: break
+                # Se vuelca de la lista con el registro más antiguo hasta alcanzar a la siguiente
+                stores[0]._spill(target, stores[1]._arrivals[0] if len(stores) > 1 else None)
+
+class ResultStore:
+    """Lista de resultados de una sesión acotada en memoria, con volcado a disco de los más antiguos"""
+    _ids = itertools.count()
+
+    def __init__(self, budget=None, label=""):
+        self.budget = budget or MemoryBudget()
+        self.label = label
+        self.id = next(self._ids)
+        self._items = []
+        self._arrivals = []  # orden de llegada a la sesión de cada registro en memoria
+        self._memory = 0
+        self._spilled = 0
+        self._spill_path = None
+        self._lock = self.budget.lock
+        self.budget.register(self)
+
+    def append(self, res):
+        record = res if isinstance(res, ResultRecord) else ResultRecord(res)
+        with self._lock:
+            self._items.append(record)
+            self._arrivals.append(self.budget.arrival())
+            self._memory += record.nbytes()
+            if self.budget.used() > self.budget.limit: self.budget.rebalance()
+        return record
+
+    def _spill(self, target, until=None):
+        """Vuelca sus registros más antiguos hasta que la sesión baje a `target` bytes
+        o hasta el primero que llegó después de `until`"""
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="wmn-sesion-", suffix=".jsonl")
+            os.close(fd)
+            # El archivo desaparece cuando la sesión suelta el store
+            weakref.finalize(self, _remove, self._spill_path)
+        used = self.budget.used()
+        count = 0
+        with open(self._spill_path, "a", encoding="utf-8") as f:
+            while count < len(self._items) and used > target and (until is None or self._arrivals[count] < until):
+                record = self._items[count]
+                f.write(json.dumps(record.to_dict(), ensure_ascii=False, default=str) + "\n")
+                size = record.nbytes()
+                self._memory -= size
+                used -= size
+                count += 1
+        del self._items[:count]
+        del self._arrivals[:count]
+        self._spilled += count
+
+    def __len__(self):
+        return self._spilled + len(self._items)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        with self._lock:
+            spilled, items, path = self._spilled, list(self._items), self._spill_path
+        if spilled:
+            with open(path, encoding="utf-8") as f:
+                for line in itertools.islice(f, spilled):
+                    yield ResultRecord(json.loads(line))
+        yield from items
+
+    def recent(self, limit):
+        """Los últimos `limit` resultados (solo de memoria si bastan)"""
+        with self._lock:
+            if limit <= len(self._items): return list(self._items[-limit:])
+        return list(deque(self, maxlen=limit))
+
+    def dicts(self):
+        return [record.to_dict() for record in self]
+
+    def fingerprint(self):
+        """Clave barata para memoizar reportes: el contenido solo crece por append"""
+        return f"{self.id}:{len(self)}"
+
+    def report(self):
+        return {"lista": self.label, "resultados": len(self), "en_memoria": len(self._items), "en_disco": self._spilled,
+                "memoria_kb": round(self._memory / 1024, 1),
+                "disco_kb": round(os.path.getsize(self._spill_path) / 1024, 1) if self._spill_path and os.path.exists(self._spill_path) else 0.0}
@@ -0,0 +1,49 @@
+from engine import EXTRACT_BYTE_CAP, BodyMatcher
+
+def make_site(**overrides):
+    site = {"name": "Ejemplo", "e_code": 200, "e_string": "profile-ok", "m_code": 404, "m_string": "Not Found"}
+    site.update(overrides)
+    return site
+
+def feed_all(matcher, *chunks):
+    for chunk in chunks:
+        if not matcher.needs_body(): break
+        matcher.feed(chunk)
+    return matcher
+
+def test_status_other_than_e_code_decides_without_body():
+    matcher = BodyMatcher(make_site(), 404)
+    assert matcher.verdict is False
+    assert not matcher.needs_body()
+
+def test_e_string_split_across_chunks():
+    matcher = feed_all(BodyMatcher(make_site(), 200), b"<html>" + b"x" * 100 + b"<div class='prof", b"ile-ok'></div>")
+    assert matcher.verdict is True
+
+def test_m_string_split_across_chunks_when_status_is_m_code():
+    site = make_site(m_code=200)
+    matcher = feed_all(BodyMatcher(site, 200), b"<h1>Page Not F", b"ound</h1>", b"profile-ok")
+    assert matcher.verdict is False
+
+def test_m_string_ignored_when_status_is_not_m_code():
+    matcher = feed_all(BodyMatcher(make_site(), 200), b"<h1>Not Found</h1>")
+    assert matcher.verdict is None
+    assert matcher.needs_body()
+
+def test_reading_stops_at_the_site_cap():
+    matcher = feed_all(BodyMatcher(make_site(max_bytes=1000), 200), *[b"x" * 300] * 10)
+    assert matcher.verdict is None
+    assert matcher.bytes_read == 1200
+    assert not matcher.needs_body()
+
+def test_status_only_site_reads_until_end_of_head():
+    matcher = BodyMatcher(make_site(e_string=None), 200)
+    assert matcher.verdict is True
+    feed_all(matcher, b"<html><head><title>Perfil</title></he", b"ad><body>", b"resto")
+    assert matcher.head_done
+    assert matcher.bytes_read == len(b"<html><head><title>Perfil</title></he" + b"ad><body>")
+    assert matcher.text().startswith("<html><head><title>Perfil</title>")
+
+def test_head_kept_for_extraction_is_capped():
+    matcher = feed_all(BodyMatcher(make_site(max_bytes=EXTRACT_BYTE_CAP * 4), 200), *[b"y" * 65536] * 8)
+    assert len(matcher.head) == EXTRACT_BYTE_CAP
@@ -0,0 +1,68 @@
+import sys
+import textwrap
+
+import pytest
+
+from engine import ExtractPool, parse_head_meta
+
+# Trabajador falso con el mismo protocolo que extract_worker.py: tarda, falla o muere según el HTML
+FAKE_WORKER = textwrap.dedent("""
+    import json, os, sys, time
+    for line in sys.stdin:
+        html = json.loads(line)["html"]
+        if html == "lento": time.sleep(30)
+        if html == "muere": sys.exit(1)
+        reply = {"error": "ValueError()"} if html == "falla" else {"data": {"pid": os.getpid(), "largo": len(html)}}
+        sys.stdout.write(json.dumps(reply) + "\\n")
+        sys.stdout.flush()
+""")
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr("engine.EXTRACT_TIMEOUT", 1)
+    pool = ExtractPool(1, [sys.executable, "-c", FAKE_WORKER])
+    yield pool
+    pool.close()
+
+def test_parse_head_meta_reads_title_and_meta():
+    html = ("<html><head><title>Juan &amp; Ana</title>"
+            "<meta property='og:image' content='/avatar.png'>"
+            "<META NAME='Description' content='Bio'>"
+            "<meta property='og:image' content='/otra.png'></head>"
+            "<body><meta property='og:title' content='en el cuerpo'></body></html>")
+    title, meta = parse_head_meta(html)
+    assert title == "Juan & Ana"
+    assert meta == {"og:image": "/avatar.png", "description": "Bio"}
+
+def test_parse_head_meta_without_head_close():
+    title, meta = parse_head_meta("<title>Solo título</title><meta name='x' content='1'><body><meta name='y' content='2'>")
+    assert title == "Solo título"
+    assert meta == {"x": "1"}
+
+def test_pool_reuses_its_worker(pool):
+    first, second = pool.extract("<html>"), pool.extract("<html></html>")
+    assert first['largo'] == 6 and second['largo'] == 13
+    assert first['pid'] == second['pid']
+
+def test_worker_error_is_raised_and_the_worker_kept(pool):
+    pid = pool.extract("a")['pid']
+    with pytest.raises(RuntimeError):
+        pool.extract("falla")
+    assert pool.extract("b")['pid'] == pid
+
+def test_timed_out_worker_is_replaced(pool):
+    pid = pool.extract("a")['pid']
+    with pytest.raises(TimeoutError):
+        pool.extract("lento")
+    assert pool.extract("b")['pid'] != pid
+
+def test_dead_worker_falls_back_to_the_calling_thread(pool, monkeypatch):
+    monkeypatch.setattr("engine.socid_extract", lambda html: {"en_hilo": True})
+    assert pool.extract("muere") == {"en_hilo": True}
+    assert "largo" in pool.extract("c")
+
+def test_real_worker_runs_socid_extractor():
+    pytest.importorskip("socid_extractor")
+    pool = ExtractPool(1)
+    try: assert pool.extract("<html><head><title>x</title></head></html>") == {}
+    finally: pool.close()
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from history import GONE_ACCOUNT, NEW_ACCOUNT, PROFILE_CHANGED, ScanHistory, diff_profiles
+
+SITE = {"name": "GitHub"}
+
+def found(details, image="https://avatars.example.com/u.png", **extra):
+    return dict({"name": SITE['name'], "uri": "https://github.com/juan", "status": "found", "image": image, "details": details}, **extra)
+
+@pytest.fixture
+def history(tmp_path):
+    return ScanHistory(str(tmp_path / "history.sqlite"))
+
+def record(history, res):
+    return history.record(SITE, "juan", res, history.snapshot("juan").get(SITE['name']))
+
+def test_diff_profiles_compares_details_and_avatar():
+    before = found({"Bio": "hola", "Seguidores": 3})
+    after = found({"Bio": "hola", "Seguidores": 4, "Blog": "x.dev"}, image="https://avatars.example.com/nuevo.png")
+    assert diff_profiles(before, after) == {
+        "Avatar": ["https://avatars.example.com/u.png", "https://avatars.example.com/nuevo.png"],
+        "Blog": [None, "x.dev"],
+        "Seguidores": ["3", "4"],
+    }
+    assert diff_profiles(before, found({"Bio": "hola", "Seguidores": 3})) == {}
+
+def test_plan_follows_the_site_rules(history):
+    record(history, found({"Bio": "hola"}))
+    assert history.plan("juan", [SITE]) == ([], [(SITE, history.snapshot("juan")[SITE['name']][3])])
+    edited = dict(SITE, e_string="nuevo")
+    assert history.plan("juan", [edited]) == ([edited], [])
+    assert history.plan("juan", [SITE], max_age=0) == ([SITE], [])
+
+def test_first_sighting_is_the_baseline(history):
+    assert record(history, found({"Bio": "hola"})) is None
+
+def test_new_gone_and_changed(history):
+    assert record(history, None) is None
+    assert record(history, found({"Bio": "hola"}))['kind'] == NEW_ACCOUNT
+    change = record(history, found({"Bio": "adiós"}))
+    assert change['kind'] == PROFILE_CHANGED
+    assert change['fields'] == {"Bio": ["hola", "adiós"]}
+    assert record(history, None)['kind'] == GONE_ACCOUNT
+
+def test_inconclusive_keeps_the_known_state(history):
+    record(history, found({"Bio": "hola"}))
+    assert record(history, {"name": SITE['name'], "uri": "u", "status": "inconclusive", "reason": "timeout"}) is None
+    assert record(history, found({"Bio": "hola"})) is None
+
+def test_failed_extraction_is_not_a_profile_change(history):
+    record(history, found({"Bio": "hola"}))
+    failed = found({}, image="https://www.google.com/s2/favicons?domain=github.com&sz=128", extract_failed=True)
+    assert record(history, failed) is None
+    # El registro bueno se conserva: el siguiente escaneo completo no cuenta como cambio
+    assert history.snapshot("juan")[SITE['name']][3]['details'] == {"Bio": "hola"}
+    assert record(history, found({"Bio": "hola"})) is None
+
+def test_failed_baseline_is_replaced_without_change(history):
+    assert record(history, found({}, extract_failed=True)) is None
+    assert record(history, found({"Bio": "hola"})) is None
+    assert record(history, found({"Bio": "adiós"}))['kind'] == PROFILE_CHANGED
+
+def test_two_writers_share_the_database(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    first, second = ScanHistory(path), ScanHistory(path)
+    # Cada tanda es una transacción corta: el otro proceso no queda bloqueado entre tandas
+    first.record(SITE, "juan", found({"Bio": "hola"}))
+    second.record({"name": "GitLab"}, "juan", None)
+    second.flush()
+    first.flush()
+    assert set(first.snapshot("juan")) == {"GitHub", "GitLab"}
+
+def test_locked_database_degrades_to_no_op(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    history = ScanHistory(path, timeout=0.05)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        assert record(history, found({"Bio": "hola"})) is None
+        history.flush()
+        assert history.snapshot("juan") == {}
+        assert history.plan("juan", [SITE]) == ([SITE], [])
+    finally:
+        blocker.execute("ROLLBACK")
+    assert record(history, found({"Bio": "hola"})) is None
+    history.flush()
+    assert "GitHub" in history.snapshot("juan")
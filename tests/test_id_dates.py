@@ -0,0 +1,41 @@
+import pytest
+
+from engine import (
+    LINKEDIN_SHIFT, TIKTOK_SHIFT, decode_linkedin_dates, decode_tiktok_dates, extract_linkedin_date, extract_tiktok_date,
+)
+
+def test_decode_tiktok_dates_sorts_and_leaves_invalid_last():
+    pytest.importorskip("pandas")
+    older, newer = 1600000000, 1700000000
+    values = ["sin id", f"https://www.tiktok.com/@a/video/{(newer << TIKTOK_SHIFT) + 123}", str(older << TIKTOK_SHIFT)]
+    timeline = decode_tiktok_dates(values, "Europe/Madrid")
+    assert [ts.timestamp() for ts in timeline["fecha_utc"][:2]] == [older, newer]
+    assert timeline["entrada"].iloc[-1] == "sin id"
+    assert timeline["fecha_utc"].isna().iloc[-1]
+    assert str(timeline["fecha_local"].dt.tz) == "Europe/Madrid"
+
+def test_decode_linkedin_dates_uses_milliseconds():
+    pytest.importorskip("pandas")
+    millis = 1650000000123
+    timeline = decode_linkedin_dates([f"https://www.linkedin.com/feed/update/urn:li:activity:{millis << LINKEDIN_SHIFT}/"])
+    assert timeline["fecha_utc"].iloc[0].value // 10 ** 6 == millis
+    assert "fecha_local" not in timeline
+
+def test_tiktok_rejects_short_ids_and_pre_launch_dates():
+    assert extract_tiktok_date("https://www.tiktok.com/@a/video/12345678") is None
+    assert extract_tiktok_date(str(1400000000 << TIKTOK_SHIFT)) is None
+    assert extract_tiktok_date(str(1700000000 << TIKTOK_SHIFT)).timestamp() == 1700000000
+    # Un ID más largo no se trunca a sus primeros 19 dígitos
+    assert extract_tiktok_date(f"https://www.tiktok.com/@a/video/{1700000000 << TIKTOK_SHIFT}1") is None
+
+def test_decoder_leaves_pre_launch_ids_undated():
+    pytest.importorskip("pandas")
+    values = [str(1400000000 << TIKTOK_SHIFT), str(1700000000 << TIKTOK_SHIFT)]
+    timeline = decode_tiktok_dates(values)
+    assert timeline["fecha_utc"].notna().tolist() == [True, False]
+    assert timeline["entrada"].iloc[-1] == values[0]
+
+def test_linkedin_scalar_matches_the_decoder():
+    pytest.importorskip("pandas")
+    url = f"https://www.linkedin.com/posts/juan_activity-{1650000000123 << LINKEDIN_SHIFT}-abcd"
+    assert extract_linkedin_date(url) == decode_linkedin_dates([url])["fecha_utc"].iloc[0].to_pydatetime()
@@ -0,0 +1,16 @@
+import json
+
+from metrics import Histogram
+
+def test_quantile_is_the_upper_bound_of_its_bucket():
+    histogram = Histogram((0.1, 0.5, 1.0))
+    for value in (0.05, 0.2, 0.3, 0.9): histogram.observe(value)
+    assert histogram.quantile(0.25) == 0.1
+    assert histogram.quantile(0.5) == 0.5
+    assert histogram.quantile(1.0) == 1.0
+
+def test_quantile_in_the_open_bucket_stays_valid_json():
+    histogram = Histogram((0.1, 0.5))
+    for value in (3.0, 7.0): histogram.observe(value)
+    assert histogram.quantile(0.95) == 0.5
+    json.dumps({"p95_ms": histogram.quantile(0.95) * 1000}, allow_nan=False)
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import engine
+from engine import MAX_RETRIES, RETRY_AFTER_MAX, HostRateLimiter, RetryBudget, parse_retry_after, plan_retry
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Limitador y presupuesto propios del test en lugar de los del proceso"""
+    limiter, budget = HostRateLimiter(5, 10), RetryBudget(0.1, 20, 500)
+    monkeypatch.setattr(engine, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(engine, "get_retry_budget", lambda: budget)
+    return limiter, budget
+
+def test_burst_then_steady_rate(clock):
+    limiter = HostRateLimiter(rate=2, burst=3)
+    assert [limiter.reserve("a.com") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.reserve("a.com") == pytest.approx(0.5)
+    assert limiter.reserve("b.com") == 0.0  # cada host tiene su propio bucket
+    clock[0] += 10
+    assert limiter.reserve("a.com") == 0.0
+
+def test_penalize_blocks_the_whole_host(clock):
+    limiter = HostRateLimiter(rate=100, burst=100)
+    limiter.penalize("a.com", 4)
+    assert limiter.reserve("a.com") == pytest.approx(4)
+    clock[0] += 3
+    assert limiter.reserve("a.com") == pytest.approx(1)
+    assert limiter.reserve("b.com") == 0.0
+
+def test_retry_budget_refills_with_requests():
+    budget = RetryBudget(ratio=0.5, min_tokens=1, max_tokens=2)
+    assert budget.spend()
+    assert not budget.spend()
+    budget.record_request()
+    budget.record_request()
+    assert budget.spend()
+    for _ in range(10): budget.record_request()
+    assert budget.spend() and budget.spend() and not budget.spend()
+
+def test_parse_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("pronto") is None
+    assert parse_retry_after(None) is None
+
+def test_plan_retry_backs_off_and_gives_up(limits):
+    assert RETRY_AFTER_MAX >= plan_retry(0, "a.com", 500) >= engine.RETRY_BACKOFF_BASE
+    assert plan_retry(MAX_RETRIES, "a.com", 500) is None
+    assert plan_retry(0, "a.com", 500, retry_after=RETRY_AFTER_MAX + 1) is None
+
+def test_throttling_is_applied_through_the_limiter(limits, clock):
+    limiter, _ = limits
+    assert plan_retry(0, "a.com", 429, retry_after=2) == 0
+    assert limiter.reserve("a.com") == pytest.approx(2)
+
+def test_plan_retry_respects_the_budget(limits):
+    _, budget = limits
+    while budget.spend(): pass
+    assert plan_retry(0, "a.com", 503, retry_after=1) is None
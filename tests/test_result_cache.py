@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+import pytest
+
+from engine import ResultCache
+
+SITE = {"name": "GitHub"}
+
+def found(user="juan"):
+    return {"name": SITE['name'], "uri": f"https://github.com/{user}", "status": "found", "username": user}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+def test_hits_are_keyed_by_normalized_username():
+    cache = ResultCache(60, 10)
+    cache.put(SITE, "Juan", found())
+    hit = cache.get(SITE, " juan ")
+    assert hit['uri'] == "https://github.com/juan"
+    assert "username" not in hit
+    assert cache.get(dict(SITE, e_string="otro"), "juan") is ResultCache.MISS
+
+def test_not_found_is_cached_and_inconclusive_is_not():
+    cache = ResultCache(60, 10)
+    cache.put(SITE, "ana", None)
+    cache.put({"name": "GitLab"}, "ana", {"name": "GitLab", "status": "inconclusive", "reason": "timeout"})
+    assert cache.get(SITE, "ana") is None
+    assert cache.get({"name": "GitLab"}, "ana") is ResultCache.MISS
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(60, 10)
+    cache.put(SITE, "juan", found())
+    clock[0] += 59
+    assert cache.get(SITE, "juan") is not ResultCache.MISS
+    clock[0] += 2
+    assert cache.get(SITE, "juan") is ResultCache.MISS
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(60, 2)
+    for user in ("a", "b"): cache.put(SITE, user, found(user))
+    cache.get(SITE, "a")
+    cache.put(SITE, "c", found("c"))
+    assert cache.get(SITE, "b") is ResultCache.MISS
+    assert cache.get(SITE, "a") is not ResultCache.MISS
+
+def test_sqlite_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    first, second = ResultCache(60, 10, path), ResultCache(60, 10, path)
+    first.put(SITE, "juan", found())
+    second.put(SITE, "ana", None)
+    assert second.get(SITE, "juan") is ResultCache.MISS  # aún en la tanda pendiente de `first`
+    first.flush()
+    second.flush()
+    assert second.get(SITE, "juan")['uri'] == "https://github.com/juan"
+    assert first.get(SITE, "ana") is None
+
+def test_locked_sqlite_is_a_miss_and_a_skipped_write(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    cache = ResultCache(60, 10, path, timeout=0.05)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        cache.put(SITE, "juan", found())
+        cache.flush()
+    finally:
+        blocker.execute("ROLLBACK")
+    # La escritura se perdió en disco, pero la copia en memoria sigue sirviendo
+    assert cache.get(SITE, "juan") is not ResultCache.MISS
+    assert ResultCache(60, 10, path).get(SITE, "juan") is ResultCache.MISS
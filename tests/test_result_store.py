@@ -0,0 +1,56 @@
+import gc
+import os
+
+from results import MemoryBudget, ResultRecord, ResultStore
+
+def hit(i, site="GitHub"):
+    return {"username": f"user{i}", "name": site, "status": "found", "uri": f"https://example.com/user{i}",
+            "details": {"Bio": "x" * 200}}
+
+def record_size():
+    return ResultRecord(hit(0)).nbytes()
+
+def test_record_reads_like_the_dict():
+    record = ResultRecord(dict(hit(1), extractor_ms=3))
+    assert record['name'] == "GitHub"
+    assert record.get('details') == {"Bio": "x" * 200}
+    assert record.get('image', "-") == "-"
+    assert record.to_dict() == dict(hit(1), extractor_ms=3)
+
+def test_spilled_records_keep_arrival_order():
+    store = ResultStore(MemoryBudget(record_size() * 10), "Lote")
+    for i in range(35): store.append(hit(i))
+    report = store.report()
+    assert report['en_disco'] > 0 and report['en_memoria'] <= 10
+    assert [r['username'] for r in store] == [f"user{i}" for i in range(35)]
+    assert [r['username'] for r in store.recent(3)] == ["user32", "user33", "user34"]
+    assert len(store.recent(30)) == 30 and store.recent(30)[0]['username'] == "user5"
+
+def test_shared_budget_spills_the_oldest_across_stores():
+    budget = MemoryBudget(record_size() * 10)
+    old, new = ResultStore(budget, "Hallazgos"), ResultStore(budget, "Lote")
+    for i in range(6): old.append(hit(i))
+    for i in range(6): new.append(hit(i, "GitLab"))
+    # Lo más antiguo de la sesión está entero en `old`: se vuelca antes que nada de `new`
+    assert old.report()['en_disco'] == 6
+    assert new.report()['en_disco'] == 0
+    assert budget.used() <= budget.limit
+    assert [r['username'] for r in old] == [f"user{i}" for i in range(6)]
+
+def test_dropped_store_frees_budget_and_spill_file():
+    budget = MemoryBudget(record_size() * 4)
+    store = ResultStore(budget, "Lote")
+    for i in range(10): store.append(hit(i))
+    path = store._spill_path
+    assert os.path.exists(path)
+    del store
+    gc.collect()
+    assert budget.used() == 0
+    assert not os.path.exists(path)
+
+def test_fingerprint_changes_with_each_append():
+    store = ResultStore(label="Hallazgos")
+    before = store.fingerprint()
+    store.append(hit(1))
+    assert store.fingerprint() != before
+    assert ResultStore(label="Otra").fingerprint() != store.fingerprint()
@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+
+import pytest
+
+from engine import ResultCache, ScanControl, run_checks
+
+SITES = [{"name": f"Sitio{i}", "cat": "social"} for i in range(8)]
+
+class FakeEngine:
+    """Motor sin red: los sitios de `answers` contestan al instante, el resto nunca"""
+    def __init__(self, answers):
+        self.answers = answers
+        self.futures = []
+
+    def submit(self, site, username):
+        future = Future()
+        if site['name'] in self.answers:
+            future.set_result(self.answers[site['name']])
+        self.futures.append(future)
+        return future
+
+def found(name):
+    return {"name": name, "uri": f"https://example.com/{name}", "status": "found"}
+
+def scan(engine, control=None, sites=SITES):
+    return run_checks(((site, "juan") for site in sites), engine, "v1", window=4, cache=ResultCache(60, 100),
+                      control=control)
+
+def test_results_are_stamped_and_cached():
+    engine = FakeEngine({s['name']: found(s['name']) if i % 2 else None for i, s in enumerate(SITES)})
+    cache = ResultCache(60, 100)
+    results = list(run_checks(((site, "juan") for site in SITES), engine, "v1", cache=cache))
+    assert len(results) == len(SITES)
+    hits = [res for _, _, res in results if res]
+    assert all(res['username'] == "juan" and res['catalog_version'] == "v1" for res in hits)
+    # Segunda pasada: todo sale de la caché sin enviar nada al motor
+    again = FakeEngine({})
+    assert len(list(run_checks(((site, "juan") for site in SITES), again, "v1", cache=cache))) == len(SITES)
+    assert again.futures == []
+
+def test_max_hits_stops_and_cancels_pending():
+    engine = FakeEngine({s['name']: found(s['name']) for s in SITES[:3]})
+    control = ScanControl(max_hits=2)
+    results = list(scan(engine, control))
+    assert len(results) == 2
+    assert control.reason == "max_hits"
+    unanswered = engine.futures[3:]
+    assert unanswered and all(f.cancelled() for f in unanswered)
+
+def test_deadline_ends_a_scan_that_never_answers():
+    engine = FakeEngine({})
+    control = ScanControl(deadline=0.2)
+    assert list(scan(engine, control)) == []
+    assert control.reason == "deadline"
+    assert all(f.cancelled() for f in engine.futures)
+
+def test_abandoned_generator_cancels_in_flight_checks():
+    engine = FakeEngine({SITES[0]['name']: found(SITES[0]['name'])})
+    checks = scan(engine)
+    assert next(checks)[2]['name'] == SITES[0]['name']
+    checks.close()
+    assert len(engine.futures) == 4  # solo `window` en vuelo, nunca todo el lote
+    assert all(f.cancelled() for f in engine.futures[1:])
+
+def test_cancel_before_start_submits_nothing():
+    engine = FakeEngine({})
+    control = ScanControl()
+    control.cancel()
+    assert list(scan(engine, control)) == []
+    assert engine.futures == []
+    assert control.reason == "cancelled"
+
+@pytest.mark.parametrize("res, counted", [(found("x"), 1), (None, 0), ({"name": "x", "status": "inconclusive"}, 0)])
+def test_only_hits_count_towards_max_hits(res, counted):
+    control = ScanControl(max_hits=5)
+    control.observe(res)
+    assert control.hits == counted
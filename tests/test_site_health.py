@@ -0,0 +1,55 @@
+from engine import (
+    ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_MIN, CHECK_TIMEOUT, FOUND, HEALTH_MIN_SAMPLES, INCONCLUSIVE, NOT_FOUND, QUARANTINE_AFTER, SiteHealth,
+)
+from metrics import CheckTrace
+
+def site(name):
+    return {"name": name, "uri_check": f"https://{name.lower()}.example/{{account}}"}
+
+def trace(name, outcome=NOT_FOUND, seconds=0.2, error=None):
+    t = CheckTrace(name)
+    t.attempts = 1
+    if error: t.error(error)
+    t.outcome, t.total = outcome, seconds
+    return t
+
+def test_quarantine_after_consecutive_network_failures():
+    health, s = SiteHealth(), site("Caido")
+    for _ in range(QUARANTINE_AFTER - 1): health.record(s, trace("Caido", INCONCLUSIVE, error="timeout"))
+    assert not health.is_quarantined("Caido")
+    health.record(s, trace("Caido", INCONCLUSIVE, error="connection_error"))
+    assert health.quarantined() == ["Caido"]
+
+def test_throttling_and_skipped_checks_do_not_count():
+    health, s = SiteHealth(), site("Limitado")
+    for _ in range(QUARANTINE_AFTER * 2): health.record(s, trace("Limitado", INCONCLUSIVE, error="throttled"))
+    skipped = trace("Limitado", INCONCLUSIVE, error="timeout")
+    skipped.attempts = 0
+    for _ in range(QUARANTINE_AFTER * 2): health.record(s, skipped)
+    assert not health.is_quarantined("Limitado")
+
+def test_conclusive_answer_resets_failures_and_quarantine():
+    health, s = SiteHealth(), site("Intermitente")
+    for _ in range(QUARANTINE_AFTER - 1): health.record(s, trace("Intermitente", INCONCLUSIVE, error="timeout"))
+    health.record(s, trace("Intermitente", FOUND))
+    health.record(s, trace("Intermitente", INCONCLUSIVE, error="timeout"))
+    assert not health.is_quarantined("Intermitente")
+    for _ in range(QUARANTINE_AFTER): health.record(s, trace("Intermitente", INCONCLUSIVE, error="timeout"))
+    assert health.is_quarantined("Intermitente")
+    health.record(s, trace("Intermitente", NOT_FOUND))
+    assert not health.is_quarantined("Intermitente")
+
+def test_timeout_adapts_to_observed_latency():
+    health = SiteHealth()
+    assert health.timeout_for("Rapido") == CHECK_TIMEOUT  # sin muestras suficientes
+    for _ in range(HEALTH_MIN_SAMPLES): health.record(site("Rapido"), trace("Rapido", seconds=0.1))
+    assert health.timeout_for("Rapido") == ADAPTIVE_TIMEOUT_MIN
+    for _ in range(HEALTH_MIN_SAMPLES): health.record(site("Lento"), trace("Lento", seconds=1.5))
+    assert health.timeout_for("Lento") == min(CHECK_TIMEOUT, 1.5 * ADAPTIVE_TIMEOUT_FACTOR)
+
+def test_slowest_first_puts_unknown_sites_in_the_middle():
+    health = SiteHealth()
+    for name, seconds in (("A", 0.1), ("B", 2.0), ("C", 0.5)):
+        health.record(site(name), trace(name, seconds=seconds))
+    order = [s['name'] for s in health.slowest_first([site(n) for n in ("A", "Nuevo", "C", "B")])]
+    assert order == ["B", "Nuevo", "C", "A"]
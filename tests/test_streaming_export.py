@@ -0,0 +1,48 @@
+import csv
+import json
+
+import pytest
+
+from reports import EXPORT_FIELDS, StreamingExport
+
+HIT = {"username": "juan", "name": "GitHub", "category": "coding", "status": "found", "uri": "https://github.com/juan",
+       "catalog_version": "abc", "details": {"Bio": "hola", "Seguidores": 3}}
+GONE = {"username": "juan", "name": "GitLab", "status": "not_found", "uri": "https://gitlab.com/juan",
+        "change": {"kind": "gone", "fields": {}}}
+
+def test_jsonl_and_csv_are_readable_before_close(tmp_path):
+    export = StreamingExport(str(tmp_path / "lote"), ("jsonl", "csv"))
+    export.add(HIT)
+    # Cada línea se vuelca al escribirse: un corte deja en disco lo ya verificado
+    with open(export.paths["jsonl"], encoding="utf-8") as f:
+        assert json.loads(f.readline())['details'] == {"Bio": "hola", "Seguidores": 3}
+    with open(export.paths["csv"], encoding="utf-8", newline="") as f:
+        assert [row['name'] for row in csv.DictReader(f)] == ["GitHub"]
+    export.close()
+
+def test_csv_rows_flatten_the_change_kind(tmp_path):
+    with StreamingExport(str(tmp_path / "lote"), ("csv",)) as export:
+        export.add(HIT)
+        export.add(GONE)
+    assert set(export.paths) == {"csv"}
+    with open(export.paths["csv"], encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == EXPORT_FIELDS
+    assert [row['change'] for row in rows] == ["", "gone"]
+    assert export.count == 2
+
+def test_parquet_keeps_details_as_a_map(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with StreamingExport(str(tmp_path / "lote"), ("parquet",)) as export:
+        export.add(HIT)
+        export.add(GONE)
+    table = pq.read_table(export.paths["parquet"])
+    assert table.column("name").to_pylist() == ["GitHub", "GitLab"]
+    assert table.column("details").to_pylist()[0] == [("Bio", "hola"), ("Seguidores", "3")]
+
+def test_empty_parquet_is_still_valid(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with StreamingExport(str(tmp_path / "vacio"), ("parquet",)) as export:
+        pass
+    assert pq.read_table(export.paths["parquet"]).num_rows == 0
@@ -0,0 +1,31 @@
+from engine import plan_variant_checks, rank_variants, username_variants
+
+def test_variants_start_with_the_seed_and_ignore_case_duplicates():
+    variants = username_variants("John.Doe")
+    assert variants[0] == "John.Doe"
+    assert "john.doe" not in variants
+    assert {"johndoe", "john_doe", "john-doe", "johndoe1", "j0hnd03"} <= set(variants)
+
+def test_numeric_seed_gets_stems_but_no_extra_suffixes():
+    variants = username_variants("ana_99")
+    assert "ana" in variants and "ana99" in variants
+    assert not any(v.endswith("123") for v in variants)
+    assert len(username_variants("ana_99", max_variants=3)) == 3
+
+def test_plan_variant_checks_skips_invalid_subdomains():
+    variants = ["John.Doe", "johndoe", "john_doe", "john-doe", "-johndoe"]
+    sites = [{"name": "Sub", "uri_check": "https://{account}.example.com"},
+             {"name": "Ruta", "uri_check": "https://example.com/u/{account}"}]
+    plan = plan_variant_checks(variants, sites)
+    assert plan["Sub"] == ["johndoe", "john-doe"]
+    assert plan["Ruta"] == variants
+
+def test_plan_variant_checks_omits_sites_without_candidates():
+    plan = plan_variant_checks(["a.b"], [{"name": "Sub", "uri_check": "https://{account}.example.com"}])
+    assert plan == {}
+
+def test_rank_variants_discounts_sites_that_accept_anyone():
+    hits = [{"name": "Todo", "username": "x"}, {"name": "Todo", "username": "y"}, {"name": "Real", "username": "y"}]
+    ranking = rank_variants(hits, ["x", "y", "z"])
+    assert [(e['username'], e['hits'], e['score']) for e in ranking] == [("y", 2, 1.5), ("x", 1, 0.5), ("z", 0, 0.0)]
+    assert ranking[0]['sites'] == ["Real", "Todo"]